@@ -0,0 +1 @@
+"""Offline benchmarks for dino, run against in-process fakes of the Discord objects it uses."""
@@ -0,0 +1,320 @@
+"""
+In-process stand-ins for the Discord objects dino touches. They implement just the attributes
+and coroutines dino calls, and count each would-be API request on a shared FakeApi instead of
+talking to Discord.
+"""
+import asyncio
+import collections
+import itertools
+import random
+import time
+
+import discord
+
+
+class FakeApi:
+    """
+    Counts simulated API calls. Every call awaits latency seconds plus a random share of
+    jitter seconds, so concurrent callers interleave the way real requests would.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = collections.Counter()
+        self.ids = itertools.count(10**17)
+        self.sequence = itertools.count()
+
+    async def call(self, name):
+        self.calls[name] += 1
+        await asyncio.sleep(self.latency + self.rng.random() * self.jitter)
+
+    def next_id(self):
+        return next(self.ids)
+
+    # Position of an event among everything the fakes have seen, for ordering across tasks
+    def next_sequence(self):
+        return next(self.sequence)
+
+    def reset(self):
+        self.calls.clear()
+
+
+class FakeRole:
+    def __init__(self, guild, role_id, name, position=1):
+        self.guild = guild
+        self.id = role_id
+        self.name = name
+        self.position = position
+        self.color = discord.Color.default()
+
+    def is_default(self):
+        return self.id == self.guild.id
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeMember:
+    """
+    A member as discord.py hands it out: a snapshot of the roles at the time it was made.
+    The guild keeps the live roles; edit() changes those and returns a fresh snapshot, and
+    the cached member from get_member() only catches up once the gateway event arrives.
+    """
+
+    def __init__(self, guild, user_id, name=None, roles=None):
+        self.guild = guild
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self._roles = dict(roles) if roles is not None else {guild.id: guild.default_role}
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+    @property
+    def roles(self):
+        return list(self._roles.values())
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    async def edit(self, *, roles=None, **fields):
+        await self.guild.api.call("member.edit")
+        if roles is not None:
+            live = {self.guild.id: self.guild.default_role}
+            live.update((role.id, role) for role in roles)
+            self.guild.set_live_roles(self.id, live)
+        return self.guild.snapshot_member(self.id)
+
+    async def add_roles(self, *roles):
+        await self.guild.api.call("member.add_roles")
+        live = self.guild.live_roles(self.id)
+        live.update((role.id, role) for role in roles)
+        self.guild.set_live_roles(self.id, live)
+
+    async def remove_roles(self, *roles):
+        await self.guild.api.call("member.remove_roles")
+        live = self.guild.live_roles(self.id)
+        for role in roles:
+            live.pop(role.id, None)
+        self.guild.set_live_roles(self.id, live)
+
+
+class FakeMessage:
+    def __init__(self, channel, message_id, content=None, embed=None, author=None):
+        self.channel = channel
+        self.id = message_id
+        self.content = content
+        self.embeds = [embed] if embed else []
+        self.author = author
+
+    async def edit(self, *, content=None, embed=None, embeds=None, **fields):
+        await self.channel.guild.api.call("message.edit")
+        if self.id not in self.channel.messages:
+            raise discord.NotFound(FakeResponse(404), "Unknown Message")
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+        if embeds is not None:
+            self.embeds = list(embeds)
+        return self
+
+    async def delete(self):
+        await self.channel.guild.api.call("message.delete")
+        if self.channel.messages.pop(self.id, None) is None:
+            raise discord.NotFound(FakeResponse(404), "Unknown Message")
+
+
+class FakePartialMessage(FakeMessage):
+    """A message known only by ID, like discord.PartialMessage; edits go to the stored message."""
+
+    async def edit(self, **fields):
+        message = self.channel.messages.get(self.id)
+        if message is None:
+            await self.channel.guild.api.call("message.edit")
+            raise discord.NotFound(FakeResponse(404), "Unknown Message")
+        return await message.edit(**fields)
+
+
+class FakeTextChannel:
+    def __init__(self, guild, channel_id, name="birthdays"):
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+        self.messages = {}
+
+    @property
+    def mention(self):
+        return f"<#{self.id}>"
+
+    async def send(self, content=None, *, embed=None, **fields):
+        await self.guild.api.call("channel.send")
+        message = FakeMessage(self, self.guild.api.next_id(), content, embed, author=self.guild.me)
+        self.messages[message.id] = message
+        return message
+
+    def get_partial_message(self, message_id):
+        return FakePartialMessage(self, message_id)
+
+    async def fetch_message(self, message_id):
+        await self.guild.api.call("channel.fetch_message")
+        try:
+            return self.messages[message_id]
+        except KeyError:
+            raise discord.NotFound(FakeResponse(404), "Unknown Message") from None
+
+    # Like TextChannel.history: newest first unless after is given, one request per 100 messages
+    async def history(self, limit=100, before=None, after=None, oldest_first=None):
+        if oldest_first is None:
+            oldest_first = after is not None
+        messages = sorted(
+            (message for message in self.messages.values()
+             if (before is None or message.id < before.id) and (after is None or message.id > after.id)),
+            key=lambda message: message.id, reverse=not oldest_first)
+        if not messages:
+            await self.guild.api.call("channel.history")
+        for index, message in enumerate(messages[:limit]):
+            if index % 100 == 0:
+                await self.guild.api.call("channel.history")
+            yield message
+
+
+class FakeGuild:
+    def __init__(self, api, guild_id, name=None):
+        self.api = api
+        self.id = guild_id
+        self.name = name or f"guild{guild_id}"
+        self.chunked = True
+        self._members = {}
+        self._roles = {}
+        self._channels = {}
+        # user_id -> role_id -> role, what Discord holds right now (the cache may lag behind)
+        self._live_roles = {}
+        self.default_role = FakeRole(self, guild_id, "@everyone", position=0)
+        self._roles[guild_id] = self.default_role
+        self.me = self.add_member(api.next_id(), "dino")
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def add_member(self, user_id, name=None):
+        member = FakeMember(self, user_id, name)
+        self._members[user_id] = member
+        self._live_roles[user_id] = dict(member._roles)
+        return member
+
+    # The roles Discord itself has for a member, as a copy
+    def live_roles(self, user_id):
+        return dict(self._live_roles[user_id])
+
+    # Change a member's roles on the "server"; the cached member hears about it one API
+    # latency later, the way a GUILD_MEMBER_UPDATE would reach discord.py's cache
+    def set_live_roles(self, user_id, roles):
+        self._live_roles[user_id] = dict(roles)
+        cached = self._members[user_id]
+        asyncio.get_running_loop().call_later(self.api.latency, setattr, cached, "_roles", dict(roles))
+
+    # A new Member object with the current roles, as in an interaction payload or an edit() result
+    def snapshot_member(self, user_id):
+        cached = self._members[user_id]
+        return FakeMember(self, user_id, cached.name, self._live_roles[user_id])
+
+    def add_role(self, role_id, name):
+        role = FakeRole(self, role_id, name)
+        self._roles[role_id] = role
+        return role
+
+    def add_text_channel(self, channel_id, name="birthdays"):
+        channel = FakeTextChannel(self, channel_id, name)
+        self._channels[channel_id] = channel
+        return channel
+
+    def get_member(self, user_id):
+        return self._members.get(user_id)
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    async def query_members(self, *, user_ids, limit=5, cache=True, **fields):
+        await self.api.call("guild.query_members")
+        return [self._members[user_id] for user_id in user_ids if user_id in self._members]
+
+
+class FakeResponse:
+    """Stands in for both aiohttp's response (for discord.HTTPException) and InteractionResponse."""
+
+    def __init__(self, status=200, interaction=None):
+        self.status = status
+        self.reason = "Fake"
+        self.interaction = interaction
+        self.done = False
+        # perf_counter() when the interaction was answered or deferred
+        self.acked_at = None
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, content=None, **fields):
+        await self.interaction.guild.api.call("interaction.send_message")
+        if self.done:
+            raise discord.InteractionResponded(self.interaction)
+        self.done = True
+        self.acked_at = time.perf_counter()
+        self.interaction.sent.append(content)
+
+    async def defer(self, **fields):
+        await self.interaction.guild.api.call("interaction.defer")
+        if self.done:
+            raise discord.InteractionResponded(self.interaction)
+        self.done = True
+        self.acked_at = time.perf_counter()
+
+
+class FakeWebhookMessage:
+    def __init__(self, interaction, content):
+        self.interaction = interaction
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, *, content=None, **fields):
+        await self.interaction.guild.api.call("followup.edit")
+        self.content = content
+        self.edits += 1
+        return self
+
+
+class FakeWebhook:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, **fields):
+        # Stamped when the handler sends, before the simulated latency reorders anything
+        self.interaction.sent_sequence = self.interaction.guild.api.next_sequence()
+        await self.interaction.guild.api.call("followup.send")
+        self.interaction.sent.append(content)
+        return FakeWebhookMessage(self.interaction, content)
+
+
+class FakeInteraction:
+    def __init__(self, guild, user, data=None):
+        self.guild = guild
+        self.guild_id = guild.id
+        # Each interaction carries its own copy of the member, taken when it was clicked
+        self.user = guild.snapshot_member(user.id) if isinstance(user, FakeMember) else user
+        self.data = data or {}
+        self.extras = {}
+        self.command = None
+        self.sent = []
+        self.sent_sequence = None
+        self.response = FakeResponse(interaction=self)
+        self.followup = FakeWebhook(self)
@@ -0,0 +1,205 @@
+"""
+Concurrent load simulator: replays thousands of overlapping /birthday submissions and role
+picker clicks against the real command handlers, with every simulated Discord call taking a
+random amount of time so the handlers interleave at their await points. Afterwards it checks
+that no submission or role assignment was lost and that every birthday list shows the stored
+data, and reports throughput plus latency and time-to-ack percentiles.
+
+    python -m bench.loadsim
+    python -m bench.loadsim --interactions 50000 --concurrency 2000 --jitter 0.05
+    python -m bench.loadsim --without-transactions   # show what the checks catch
+
+Exits with status 1 if any check fails.
+"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import random
+import shutil
+import sys
+import time
+
+from bench.suite import SCRATCH_DIRECTORY, dino, random_birthday, reset_dino
+from bench.fakes import FakeApi, FakeGuild, FakeInteraction
+
+
+@contextlib.asynccontextmanager
+async def no_transaction(guild_id, scope=None):
+    yield
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Simulation:
+    def __init__(self, args):
+        self.args = args
+        self.api = FakeApi(args.latency, args.jitter, args.seed)
+        self.rng = random.Random(args.seed)
+        self.guilds = []
+        self.roles = {}  # guild_id -> [FakeRole]
+        self.selects = {}  # guild_id -> RolePickerSelect
+        self.latencies = []
+        # Time from each interaction starting to it being answered or deferred
+        self.ack_latencies = []
+        # (guild_id, user_id) -> replies to that member's /birthday submissions
+        self.birthday_replies = collections.defaultdict(list)
+        # (sequence, guild_id, user_id, role_id, reply) for each role click; replayed in the order
+        # the handlers sent their replies to work out the role each member should hold
+        self.role_replies = []
+
+    def setup(self):
+        for _ in range(self.args.guilds):
+            guild = FakeGuild(self.api, self.api.next_id())
+            channel = guild.add_text_channel(self.api.next_id())
+            dino.set_birthday_channel_id(guild.id, channel.id)
+            roles = [guild.add_role(self.api.next_id(), f"role{index}") for index in range(self.args.roles)]
+            dino.update_roles_for_guild(guild.id, [{"id": role.id, "name": role.name, "color": str(role.color)} for role in roles])
+            for _ in range(self.args.members):
+                guild.add_member(self.api.next_id())
+            self.guilds.append(guild)
+            self.roles[guild.id] = roles
+            self.selects[guild.id] = dino.RolePickerSelect(
+                custom_id=dino.ROLE_PICKER_CUSTOM_ID.format(0), options=dino.role_select_options(guild))
+
+    # A random mix of birthday submissions (some members submit more than once) and role clicks
+    def plan(self):
+        plan = []
+        for _ in range(self.args.interactions):
+            guild = self.rng.choice(self.guilds)
+            member = self.rng.choice(guild.members[1:])  # Everyone but the bot itself
+            if self.rng.random() < self.args.birthday_share:
+                plan.append(("birthday", guild, member, random_birthday(self.rng)))
+            else:
+                plan.append(("role", guild, member, self.rng.choice(self.roles[guild.id]).id))
+        return plan
+
+    async def run_one(self, limit, kind, guild, member, payload):
+        async with limit:
+            started = time.perf_counter()
+            if kind == "birthday":
+                interaction = FakeInteraction(guild, member)
+                await dino.birthday.callback(interaction, payload)
+                self.birthday_replies[(guild.id, member.id)].append((payload, interaction.sent[-1]))
+            else:
+                interaction = FakeInteraction(guild, member, {"values": [str(payload)]})
+                await self.selects[guild.id].callback(interaction)
+                self.role_replies.append((interaction.sent_sequence, guild.id, member.id, payload, interaction.sent[-1]))
+            self.latencies.append(time.perf_counter() - started)
+            self.ack_latencies.append(interaction.response.acked_at - started)
+
+    def expected_roles(self):
+        expected = {}
+        for _, guild_id, user_id, role_id, reply in sorted(self.role_replies):
+            key = (guild_id, user_id)
+            if reply.endswith(" from you."):  # Toggled off
+                if expected.get(key) == role_id:
+                    expected[key] = None
+            elif reply.endswith(" to you."):
+                expected[key] = role_id
+        return expected
+
+    async def run(self):
+        limit = asyncio.Semaphore(self.args.concurrency)
+        plan = self.plan()
+        self.api.reset()
+        started = time.perf_counter()
+        await asyncio.gather(*(self.run_one(limit, *step) for step in plan))
+        elapsed = time.perf_counter() - started
+        # Let the debounced birthday list refreshes finish before checking them, including any
+        # that already left pending_embed_updates and are editing right now
+        while dino.pending_embed_updates:
+            await asyncio.gather(*list(dino.pending_embed_updates.values()))
+        for guild in self.guilds:
+            async with dino.guild_transaction(guild.id, "birthday_embed"):
+                pass
+        return elapsed
+
+    def check(self):
+        problems = []
+        for (guild_id, user_id), replies in self.birthday_replies.items():
+            accepted = [date for date, reply in replies if "has been added" in reply]
+            stored = dino.get_user_birthday(guild_id, user_id)
+            if len(accepted) != 1:
+                problems.append(f"member {user_id} in guild {guild_id}: {len(accepted)} of {len(replies)} submissions accepted")
+            elif stored != accepted[0]:
+                problems.append(f"member {user_id} in guild {guild_id}: accepted {accepted[0]} but stored {stored}")
+
+        expected_roles = self.expected_roles()
+        for guild in self.guilds:
+            managed = {role.id for role in self.roles[guild.id]}
+            for member in guild.members[1:]:
+                held = [role_id for role_id in guild.live_roles(member.id) if role_id in managed]
+                tracked = dino.get_user_current_managed_role(guild.id, member.id)
+                expected = expected_roles.get((guild.id, member.id))
+                if held != ([expected] if expected else []) or tracked != expected:
+                    problems.append(f"member {member.id} in guild {guild.id}: expected role {expected}, holds {held}, tracked {tracked}")
+
+            info = dino.get_birthday_embed_info(guild.id)
+            if dino.get_guild_birthdays(guild.id):
+                shown = info.get("content_hashes") if info else None
+                rendered = [content_hash for _, content_hash in dino.render_birthday_pages(guild)]
+                channel = guild.get_channel(dino.get_birthday_channel_id(guild.id))
+                missing = [message_id for message_id in dino.get_birthday_embed_message_ids(info) if message_id not in channel.messages]
+                if shown != rendered or missing:
+                    problems.append(f"guild {guild.id}: birthday list out of date or missing pages")
+        return problems
+
+    def report(self, elapsed, problems):
+        latencies = sorted(self.latencies)
+        print(f"{len(latencies)} interactions over {len(self.guilds)} guilds in {elapsed:.2f} s "
+              f"({len(latencies) / elapsed:.0f}/s, concurrency {self.args.concurrency})")
+        for label, values in (("latency", latencies), ("time to ack", sorted(self.ack_latencies))):
+            print(f"{label} ms: " + ", ".join(
+                f"{name} {percentile(values, fraction) * 1000:.1f}"
+                for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))))
+        print("simulated API calls: " + ", ".join(f"{name}={count}" for name, count in sorted(self.api.calls.items())))
+        if problems:
+            print(f"FAILED: {len(problems)} problems")
+            for problem in problems[:20]:
+                print(f"  {problem}")
+        else:
+            print("OK: no lost submissions or role assignments")
+
+
+async def simulate(args):
+    reset_dino()
+    if args.without_transactions:
+        dino.guild_transaction = no_transaction
+    simulation = Simulation(args)
+    simulation.setup()
+    elapsed = await simulation.run()
+    problems = simulation.check()
+    simulation.report(elapsed, problems)
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent interaction load simulator for dino")
+    parser.add_argument("--interactions", type=int, default=20_000, help="interactions to replay (default: 20000)")
+    parser.add_argument("--concurrency", type=int, default=1000, help="interactions in flight at once (default: 1000)")
+    parser.add_argument("--guilds", type=int, default=20, help="guilds (default: 20)")
+    parser.add_argument("--members", type=int, default=500, help="members per guild (default: 500)")
+    parser.add_argument("--roles", type=int, default=10, help="switchable roles per guild (default: 10)")
+    parser.add_argument("--birthday-share", type=float, default=0.5,
+                        help="fraction of interactions that are /birthday submissions (default: 0.5)")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per simulated API call (default: 0.002)")
+    parser.add_argument("--jitter", type=float, default=0.01,
+                        help="extra random seconds per simulated API call, up to this much (default: 0.01)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--without-transactions", action="store_true",
+                        help="run the handlers without guild_transaction, to check the checks catch races")
+    args = parser.parse_args(argv)
+
+    problems = asyncio.run(simulate(args))
+    dino.store.close()
+    shutil.rmtree(SCRATCH_DIRECTORY, ignore_errors=True)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""
+Offline benchmark suite: drives dino's real storage helpers, renders, embed updates, daily
+check, role select callback and bulk embed editor against bench.fakes at synthetic scale, and
+reports wall time, peak traced allocations and simulated Discord API calls for each scenario.
+
+    python -m bench.suite                      # 10k and 100k birthdays per guild, 1000 guilds
+    python -m bench.suite --birthdays 5000 --guilds 200 --json results.json
+
+Each scenario is set up from scratch twice: once timed without tracemalloc, once with it for
+the allocation figures, so tracing overhead never shows up in the timings.
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# dino reads its configuration at import time: keep its files in a scratch directory and
+# never flush on a timer, so only the storage scenarios write to disk
+INVOKED_FROM = os.getcwd()
+# dino.py sits next to this package; keep it importable once the working directory moves
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCRATCH_DIRECTORY = tempfile.mkdtemp(prefix="dino-bench-")
+os.chdir(SCRATCH_DIRECTORY)
+os.environ.setdefault("DINO_STORAGE", "json")
+os.environ["DINO_FLUSH_DELAY"] = "3600"
+os.environ["DINO_EMBED_DEBOUNCE"] = "0"
+
+import dino  # noqa: E402
+from bench.fakes import FakeApi, FakeGuild, FakeInteraction  # noqa: E402
+
+TODAY = datetime.date(2024, 6, 15)
+
+
+# Forget everything dino holds in memory, and start over with an empty backend in a new directory
+def reset_dino():
+    if dino.store._flush_task is not None:
+        dino.store._flush_task.cancel()
+        dino.store._flush_task = None
+    dino.store.backend.close()
+    os.chdir(tempfile.mkdtemp(dir=SCRATCH_DIRECTORY))
+    dino.store.backend = dino.create_backend()
+    dino.store.load()
+    dino.birthday_render_cache.clear()
+    dino.role_option_cache.clear()
+    dino.member_lookup_cache.clear()
+    dino.guild_locks.clear()
+    dino.pending_embed_updates.clear()
+
+
+def random_birthday(rng):
+    day = datetime.date(2000, 1, 1) + datetime.timedelta(days=rng.randrange(366))
+    return day.strftime("%m/%d")
+
+
+# A guild with `birthdays` members who all have a stored birthday and a birthday channel
+def make_guild(api, rng, birthdays, guild_id=None):
+    guild = FakeGuild(api, guild_id or api.next_id())
+    channel = guild.add_text_channel(api.next_id())
+    dino.set_birthday_channel_id(guild.id, channel.id)
+    for _ in range(birthdays):
+        member = guild.add_member(api.next_id())
+        dino.set_user_birthday(guild.id, member.id, random_birthday(rng))
+    return guild
+
+
+class Scenario:
+    """setup() prepares the state and returns the coroutine function that is measured."""
+
+    def __init__(self, name, setup):
+        self.name = name
+        self.setup = setup
+
+
+def storage_scenarios(api, birthdays):
+    async def set_birthdays():
+        guild_id = api.next_id()
+        user_ids = [api.next_id() for _ in range(birthdays)]
+        rng = random.Random(1)
+
+        async def run():
+            for user_id in user_ids:
+                dino.set_user_birthday(guild_id, user_id, random_birthday(rng))
+        return run
+
+    async def flush_birthdays():
+        make_guild(api, random.Random(2), birthdays)
+
+        async def run():
+            dino.store.flush()
+        return run
+
+    async def load_birthdays():
+        make_guild(api, random.Random(3), birthdays)
+        dino.store.flush()
+
+        async def run():
+            dino.store.load()
+        return run
+
+    async def lookups():
+        guild = make_guild(api, random.Random(4), birthdays)
+
+        async def run():
+            for offset in range(366):
+                day = TODAY + datetime.timedelta(days=offset)
+                dino.store.birthdays_on(day, guild.id)
+                dino.store.upcoming_birthdays(guild.id, day)
+        return run
+
+    async def next_ten():
+        guild = make_guild(api, random.Random(4), birthdays)
+
+        async def run():
+            for offset in range(366):
+                dino.store.next_birthdays(guild.id, TODAY + datetime.timedelta(days=offset), count=10)
+        return run
+
+    return [
+        Scenario(f"store: set {birthdays} birthdays", set_birthdays),
+        Scenario(f"store: flush {birthdays} birthdays ({dino.STORAGE_BACKEND})", flush_birthdays),
+        Scenario(f"store: load {birthdays} birthdays ({dino.STORAGE_BACKEND})", load_birthdays),
+        Scenario(f"store: 366 days of lookups, {birthdays} birthdays", lookups),
+        Scenario(f"store: 366 days of next 10 birthdays, {birthdays} birthdays", next_ten),
+    ]
+
+
+def embed_scenarios(api, birthdays):
+    async def render():
+        guild = make_guild(api, random.Random(5), birthdays)
+
+        async def run():
+            dino.render_birthday_pages(guild)
+        return run
+
+    async def send_initial():
+        guild = make_guild(api, random.Random(6), birthdays)
+
+        async def run():
+            await dino.send_initial_birthday_embed(guild)
+        return run
+
+    async def update_after_one_change():
+        rng = random.Random(7)
+        guild = make_guild(api, rng, birthdays)
+        await dino.send_initial_birthday_embed(guild)
+        member = guild.add_member(api.next_id())
+        dino.set_user_birthday(guild.id, member.id, random_birthday(rng))
+
+        async def run():
+            await dino.update_birthday_embed(guild)
+        return run
+
+    return [
+        Scenario(f"render_birthday_pages: {birthdays} birthdays", render),
+        Scenario(f"send_initial_birthday_embed: {birthdays} birthdays", send_initial),
+        Scenario(f"update_birthday_embed: {birthdays} birthdays, one new", update_after_one_change),
+    ]
+
+
+def daily_scenarios(api, birthdays, guilds, per_guild):
+    async def one_big_guild():
+        guild = make_guild(api, random.Random(8), birthdays)
+
+        async def run():
+            await dino.birthday_check(guild, TODAY)
+        return run
+
+    async def many_guilds():
+        rng = random.Random(9)
+        all_guilds = [make_guild(api, rng, per_guild) for _ in range(guilds)]
+
+        async def run():
+            await asyncio.gather(*(dino.birthday_check(guild, TODAY) for guild in all_guilds))
+        return run
+
+    return [
+        Scenario(f"birthday_check: 1 guild, {birthdays} birthdays", one_big_guild),
+        Scenario(f"birthday_check: {guilds} guilds x {per_guild} birthdays", many_guilds),
+    ]
+
+
+def role_scenarios(api, clicks):
+    async def select_callback():
+        rng = random.Random(10)
+        guild = FakeGuild(api, api.next_id())
+        roles = [guild.add_role(api.next_id(), f"role{index}") for index in range(dino.SELECT_OPTION_LIMIT)]
+        dino.update_roles_for_guild(guild.id, [{"id": role.id, "name": role.name, "color": str(role.color)} for role in roles])
+        members = [guild.add_member(api.next_id()) for _ in range(max(1, clicks // 10))]
+        select = dino.RolePickerSelect(custom_id=dino.ROLE_PICKER_CUSTOM_ID.format(0), options=dino.role_select_options(guild))
+        interactions = [
+            FakeInteraction(guild, rng.choice(members), {"values": [str(rng.choice(roles).id)]})
+            for _ in range(clicks)
+        ]
+
+        async def run():
+            for interaction in interactions:
+                await select.callback(interaction)
+        return run
+
+    return [Scenario(f"role select callback: {clicks} clicks", select_callback)]
+
+
+def bulk_edit_scenarios(api, count):
+    async def update_last():
+        guild = FakeGuild(api, api.next_id())
+        channel = guild.add_text_channel(api.next_id())
+        for _ in range(count):
+            await channel.send(embed=dino.discord.Embed(title="Old title", description="Old description"))
+        interaction = FakeInteraction(guild, guild.me)
+
+        async def run():
+            await dino.update_embeds.callback(interaction, channel, last=count, title="New title")
+        return run
+
+    return [Scenario(f"update_embeds: last {count} messages", update_last)]
+
+
+async def measure(scenario, api, trace):
+    reset_dino()
+    run = await scenario.setup()
+    api.reset()
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - started
+    peak = None
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak, dict(api.calls)
+
+
+async def run_suite(args):
+    api = FakeApi(latency=args.latency)
+    scenarios = []
+    for birthdays in args.birthdays:
+        scenarios += storage_scenarios(api, birthdays)
+        scenarios += embed_scenarios(api, birthdays)
+        scenarios += daily_scenarios(api, birthdays, args.guilds, args.per_guild)
+    scenarios += role_scenarios(api, args.clicks)
+    scenarios += bulk_edit_scenarios(api, dino.BULK_EDIT_SCAN_LIMIT)
+    # Scenarios that do not depend on the birthday count appear once
+    unique = {}
+    for scenario in scenarios:
+        unique.setdefault(scenario.name, scenario)
+
+    results = []
+    for scenario in unique.values():
+        if args.filter and args.filter not in scenario.name:
+            continue
+        elapsed, _, calls = await measure(scenario, api, trace=False)
+        peak = None
+        if not args.no_tracemalloc:
+            _, peak, _ = await measure(scenario, api, trace=True)
+        results.append({"name": scenario.name, "seconds": elapsed, "peak_bytes": peak, "api_calls": calls})
+        print_result(results[-1])
+    return results
+
+
+def print_result(result):
+    peak = "-" if result["peak_bytes"] is None else f"{result['peak_bytes'] / 1024:.0f} KiB"
+    calls = ", ".join(f"{name}={count}" for name, count in sorted(result["api_calls"].items())) or "none"
+    print(f"{result['name']:<60} {result['seconds']:>9.4f} s {peak:>12}   {calls}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline dino benchmarks against fake Discord objects")
+    parser.add_argument("--birthdays", type=int, nargs="+", default=[10_000, 100_000],
+                        help="birthdays per guild for the single-guild scenarios (default: 10000 100000)")
+    parser.add_argument("--guilds", type=int, default=1000, help="guilds in the many-guild daily check (default: 1000)")
+    parser.add_argument("--per-guild", type=int, default=100,
+                        help="birthdays per guild in the many-guild daily check (default: 100)")
+    parser.add_argument("--clicks", type=int, default=10_000, help="role select interactions (default: 10000)")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per API call (default: 0)")
+    parser.add_argument("--filter", help="only run scenarios whose name contains this text")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip the allocation measurement pass")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH as JSON")
+    args = parser.parse_args(argv)
+
+    print(f"{'scenario':<60} {'time':>11} {'peak alloc':>12}   simulated API calls")
+    results = asyncio.run(run_suite(args))
+    if args.json:
+        with open(os.path.join(INVOKED_FROM, args.json), "w") as file:
+            json.dump(results, file, indent=4)
+    dino.store.close()
+    shutil.rmtree(SCRATCH_DIRECTORY, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
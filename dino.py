@@ -1,12 +1,32 @@
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord.ui import Select, View
 import os
 import json
+import sqlite3
+import argparse
+import asyncio
+import concurrent.futures
+import threading
+import signal
+import tempfile
 from dotenv import load_dotenv
-from discord.ext.commands import has_permissions
 import datetime
+import calendar
+import heapq
+import bisect
+import hashlib
+import collections
+import contextlib
+import contextvars
+import logging
+from aiohttp import web
+import time
+import zoneinfo
+import string
+import csv
+import io
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -14,476 +34,2240 @@ load_dotenv()
 # Get the bot token from the environment variable
 TOKEN = os.getenv('DISCORD_TOKEN')
 
+# --- Logging ---
+# Everything logs through the "dino" logger. DINO_LOG_FORMAT=json writes one JSON object per
+# line, with any extra= fields (guild_id, ...) as keys, for log collectors; "text" is for humans.
+LOG_LEVEL = os.getenv('DINO_LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('DINO_LOG_FORMAT', 'text')
+log = logging.getLogger("dino")
+
+class JsonLogFormatter(logging.Formatter):
+    # Attributes every record has; anything else was passed in through extra=
+    RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in self.RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+# Send our logs and discord.py's to stderr in the configured format
+def setup_logging():
+    handler = logging.StreamHandler()
+    handler.setLevel(LOG_LEVEL)
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-8s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(handler)
+    # Rate-limit warnings from discord.py feed the REST metrics
+    logging.getLogger("discord.http").addHandler(RateLimitMetricsHandler())
+
+# --- Metrics ---
+# A small in-process registry exposed in the Prometheus text format on METRICS_PORT (0 turns
+# the endpoint off). Metrics may be updated from the storage writer thread, hence the locks.
+METRICS_HOST = os.getenv('DINO_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('DINO_METRICS_PORT', '0'))
+metrics_registry = []
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, format_labels(self.labelnames, key), value) for key, value in self.values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(Counter):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    # values: labels -> [count per bucket..., count, sum]
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            counts = self.values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    # Time the enclosed block
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, counts in self.values.items():
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", format_labels(self.labelnames, key, [("le", bound)]), count))
+                samples.append((f"{self.name}_bucket", format_labels(self.labelnames, key, [("le", "+Inf")]), counts[-2]))
+                samples.append((f"{self.name}_count", format_labels(self.labelnames, key), counts[-2]))
+                samples.append((f"{self.name}_sum", format_labels(self.labelnames, key), counts[-1]))
+        return samples
+
+def render_metrics():
+    lines = []
+    for metric in metrics_registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+COMMAND_SECONDS = Histogram("dino_command_duration_seconds", "Time from a slash command reaching the bot to it finishing.", ("command", "outcome"))
+STORAGE_LOAD_SECONDS = Gauge("dino_storage_load_seconds", "Time taken to load the stored data at startup.", ("backend",))
+STORAGE_LOAD_BYTES = Gauge("dino_storage_load_bytes", "Size on disk of the stored data at startup.", ("backend",))
+STORAGE_SAVE_SECONDS = Histogram("dino_storage_save_seconds", "Time taken by one write of dirty data to the backend.", ("backend",))
+STORAGE_SAVE_BYTES = Counter("dino_storage_save_bytes_total", "Bytes written by storage saves (row payload bytes for SQLite).", ("backend",))
+STORAGE_SAVE_FAILURES = Counter("dino_storage_save_failures_total", "Storage saves that failed and were retried.", ("backend",))
+STORAGE_DROPPED_CHANGES = Counter("dino_storage_dropped_changes_total", "Changes the backend can never store, dropped instead of retried.", ("backend",))
+RENDER_SECONDS = Histogram("dino_embed_render_seconds", "Time taken to render a guild's birthday list (cache misses only).")
+REST_REQUESTS = Counter("dino_rest_requests_total", "Discord REST requests, by the bot code that made them.", ("site", "method", "route"))
+REST_REQUEST_SECONDS = Histogram("dino_rest_request_seconds", "Discord REST request time, including rate-limit waits.", ("site",))
+REST_RATELIMITED = Counter("dino_rest_ratelimited_total", "Discord REST requests that were answered with a 429.", ("site",))
+REST_RATELIMIT_WAIT_SECONDS = Counter("dino_rest_ratelimit_wait_seconds_total", "Time spent waiting out 429 responses.", ("site",))
+REST_GLOBAL_RATELIMITS = Counter("dino_rest_global_ratelimits_total", "Global rate limits hit.")
+DAILY_CHECK_SECONDS = Histogram("dino_daily_check_seconds", "Time taken by one guild's daily birthday check.")
+INTERACTION_ACK_SECONDS = Histogram("dino_interaction_ack_seconds", "Time from an interaction reaching the bot to it being answered or deferred.", ("command",))
+BACKGROUND_TASK_FAILURES = Counter("dino_background_task_failures_total", "Work left running after answering an interaction that failed.", ("command",))
+DAILY_CHECK_LAST_SECONDS = Gauge("dino_daily_check_last_duration_seconds", "Duration of each guild's latest daily birthday check.", ("guild_id",))
+
+# The part of the bot making REST requests, so every request and rate limit is attributed to it.
+# Tasks inherit the value they were created with; commands set it per interaction.
+rest_call_site = contextvars.ContextVar("rest_call_site", default="other")
+
+@contextlib.contextmanager
+def call_site(name):
+    token = rest_call_site.set(name)
+    try:
+        yield
+    finally:
+        rest_call_site.reset(token)
+
+# Count and time every request made through the bot's HTTP client
+def instrument_http(http):
+    request = http.request
+
+    async def timed_request(route, **kwargs):
+        site = rest_call_site.get()
+        started = time.perf_counter()
+        try:
+            return await request(route, **kwargs)
+        finally:
+            REST_REQUESTS.inc(site=site, method=route.method, route=route.path)
+            REST_REQUEST_SECONDS.observe(time.perf_counter() - started, site=site)
+    http.request = timed_request
+
+class RateLimitMetricsHandler(logging.Handler):
+    """Turns discord.py's 429 warnings into rate-limit metrics for the current call site."""
+
+    def emit(self, record):
+        if record.msg.startswith("We are being rate limited.") and "Retrying in" in record.msg:
+            site = rest_call_site.get()
+            REST_RATELIMITED.inc(site=site)
+            REST_RATELIMIT_WAIT_SECONDS.inc(record.args[-1], site=site)
+        elif record.msg.startswith("Global rate limit has been hit."):
+            REST_GLOBAL_RATELIMITS.inc()
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """Command tree that times every slash command and attributes its REST calls to it."""
+
+    async def interaction_check(self, interaction):
+        interaction.extras["started"] = time.perf_counter()
+        rest_call_site.set(f"command:{interaction.data.get('name', 'unknown')}")
+        return True
+
+    async def on_error(self, interaction, error):
+        if isinstance(error, app_commands.MissingPermissions):
+            observe_command(interaction, "denied")
+            await reply(interaction, "You don't have permission to use this command.", ephemeral=True)
+            return
+        observe_command(interaction, "error")
+        await super().on_error(interaction, error)
+
+def observe_command(interaction, outcome):
+    started = interaction.extras.get("started")
+    if started is not None and interaction.command is not None:
+        COMMAND_SECONDS.observe(time.perf_counter() - started, command=interaction.command.qualified_name, outcome=outcome)
+
+# --- Interaction Acknowledgement ---
+# Discord drops an interaction that is not answered within 3 seconds. Handlers that only touch
+# memory answer at once with reply(). Handlers that must call Discord (or wait for a lock held
+# by one that does) first acknowledge with defer() and answer with interaction.followup.send.
+# Work that may finish after the answer goes to run_in_background(). reply() and defer() record
+# how long the interaction waited to be acknowledged.
+
+# Name an interaction is measured under: its slash command, or "component" for selects and buttons
+def interaction_name(interaction):
+    return interaction.command.qualified_name if interaction.command is not None else "component"
+
+def observe_ack(interaction):
+    started = interaction.extras.get("started")
+    if started is not None:
+        INTERACTION_ACK_SECONDS.observe(time.perf_counter() - started, command=interaction_name(interaction))
+
+# Answer an interaction straight away
+async def reply(interaction, content=None, **kwargs):
+    await interaction.response.send_message(content, **kwargs)
+    observe_ack(interaction)
+
+# Acknowledge an interaction ahead of slow work; the answer follows with interaction.followup.send
+async def defer(interaction, ephemeral=True):
+    await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+    observe_ack(interaction)
+
+# Tasks started by run_in_background, referenced until they finish so they cannot be collected early
+background_tasks = set()
+
+# Run work for an interaction that does not need to hold up its answer. The task keeps the
+# interaction's REST call site; failures are logged and counted instead of vanishing.
+def run_in_background(interaction, coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(lambda task: finish_background_task(interaction, task))
+    return task
+
+def finish_background_task(interaction, task):
+    background_tasks.discard(task)
+    if task.cancelled() or task.exception() is None:
+        return
+    name = interaction_name(interaction)
+    BACKGROUND_TASK_FAILURES.inc(command=name)
+    log.error("Background work for %s failed: %s", name, task.exception(), exc_info=task.exception(), extra={"guild_id": interaction.guild_id})
+
+metrics_runner = None
+
+async def handle_metrics(request):
+    return web.Response(body=render_metrics().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def start_metrics_server(host, port):
+    """Serves GET /metrics in the Prometheus text format; returns the runner to clean it up."""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return runner
+
+# Which guild members are kept in memory (DINO_MEMBER_CACHE):
+#   full    - every member of every guild, fetched at startup (default)
+#   tracked - only members with a stored birthday or role, fetched at startup
+#   lazy    - nothing up front; members are looked up when needed and kept in a small LRU
+# Under tracked and lazy, members missing from the cache are shown as mentions in the list.
+MEMBER_CACHE_POLICY = os.getenv('DINO_MEMBER_CACHE', 'full')
+MEMBER_LRU_SIZE = int(os.getenv('DINO_MEMBER_LRU_SIZE', '1024'))
+# Seconds between memory use reports in the log; 0 turns them off
+MEMORY_REPORT_INTERVAL = float(os.getenv('DINO_MEMORY_REPORT_INTERVAL', '3600'))
+if MEMBER_CACHE_POLICY not in ("full", "tracked", "lazy"):
+    raise SystemExit(f"Unknown DINO_MEMBER_CACHE policy: {MEMBER_CACHE_POLICY}")
+
 # Initialize bot
 intents = discord.Intents.default()
 intents.members = True  # Ensure the bot has permission to fetch members and roles
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+if MEMBER_CACHE_POLICY == "full":
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+else:
+    # Members we fetch ourselves are still cached; nothing else is
+    member_cache_flags = discord.MemberCacheFlags.none()
+# Shards are launched by discord.py; run with --shard-count/--shard-ids to split them over processes
+bot = commands.AutoShardedBot(command_prefix="!", intents=intents, member_cache_flags=member_cache_flags,
+                              chunk_guilds_at_startup=MEMBER_CACHE_POLICY == "full", tree_cls=InstrumentedCommandTree)
+instrument_http(bot.http)
+
+# Timezone used for guilds that have not picked one with /set_birthday_timezone
+DEFAULT_TIMEZONE = os.getenv('DINO_DEFAULT_TIMEZONE', 'UTC')
+# How many missed days the scheduler catches up on after downtime
+MAX_CATCH_UP_DAYS = int(os.getenv('DINO_MAX_CATCH_UP_DAYS', '7'))
+# Seconds before the scheduler tries a guild again when its last check could not be saved
+DAILY_CHECK_RETRY_SECONDS = 60
+# Hash of the slash command definitions last synced to Discord; the tree is only synced again
+# when it changes, or when the bot is started with --force-sync
+COMMAND_HASH_FILE = os.getenv('DINO_COMMAND_HASH_FILE', 'command_tree.sha256')
+force_command_sync = False
+
+# --- Sharding ---
+# By default this process runs every shard. To spread the bot over several processes, give
+# each one the same DINO_SHARD_COUNT and its own DINO_SHARD_IDS (e.g. "0-3" or "4,5"); each
+# process then only loads, checks and cleans up the guilds on its own shards. Processes share
+# the SQLite database, whose per-row writes never touch another process's guilds.
+SHARD_COUNT = os.getenv('DINO_SHARD_COUNT')
+SHARD_IDS = os.getenv('DINO_SHARD_IDS')
+
+# Parse a shard list such as "0-3,6" into [0, 1, 2, 3, 6]
+def parse_shard_ids(spec):
+    shard_ids = []
+    for part in spec.split(','):
+        first, _, last = part.strip().partition('-')
+        shard_ids.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(shard_ids))
+
+# Whether a guild is on one of the shards this process runs
+def owns_guild(guild_id):
+    if bot.shard_ids is None:
+        return True
+    return (int(guild_id) >> 22) % bot.shard_count in bot.shard_ids
+
+# --- Storage ---
+# All stored data is loaded once at startup and served from memory. Mutations go through
+# Store.set/Store.delete, which hand the change to the configured backend and mark the data
+# dirty; dirty data is flushed together after FLUSH_DELAY seconds on a background writer
+# thread, so a burst of changes costs a single write and never blocks the event loop.
+#   json   - roles.json, user_roles.json and birthdays.json, rewritten whole on flush (default)
+#   sqlite - one row per birthday/tracked role in DATABASE_FILE, committed on flush
+#   journal - each change appended to JOURNAL_FILE over a JSON snapshot, compacted once the
+#             journal grows past JOURNAL_COMPACT_BYTES
+STORAGE_BACKEND = os.getenv('DINO_STORAGE', 'json')
+DATABASE_FILE = os.getenv('DINO_DATABASE', 'dino.db')
+JOURNAL_FILE = os.getenv('DINO_JOURNAL', 'dino.journal')
+JOURNAL_COMPACT_BYTES = int(os.getenv('DINO_JOURNAL_COMPACT_BYTES', str(1024 * 1024)))
+FLUSH_DELAY = float(os.getenv('DINO_FLUSH_DELAY', '2'))
+
+DATA_FILES = {
+    "roles": "roles.json",
+    "user_roles": "user_roles.json",
+    "birthdays": "birthdays.json",
+}
+
+
+# Marker passed to backends when a value is removed
+DELETED = object()
+
+
+# Parse an "MM/DD" birthday string into (month, day); raises ValueError if malformed
+def parse_birthday(birthday_str):
+    month, day = map(int, birthday_str.split('/'))
+    return month, day
+
+
+# Canonical "MM/DD" for a valid birthday string (02/29 included), or None; /birthday and bulk
+# imports accept exactly the same dates
+def normalize_birthday(date):
+    try:
+        month, day = map(int, str(date).split('/'))
+        datetime.date(2000, month, day)
+    except ValueError:
+        return None
+    return f"{month:02d}/{day:02d}"
 
-# --- Role Management (roles.json) ---
-# Load roles data from the roles.json file
-def load_roles():
-    if os.path.exists("roles.json"):
-        with open("roles.json", "r") as file:
-            return json.load(file)
-    return {}
-
-# Save roles data to the roles.json file
-def save_roles(data):
-    with open("roles.json", "w") as file:
-        json.dump(data, file, indent=4)
 
+# Discord IDs are positive 64-bit integers, and SQLite stores nothing larger than 2**63 - 1
+SNOWFLAKE_MAX = 2**63 - 1
+
+# The ID written in text (plain ASCII digits only), or None if it cannot be a Discord ID
+def parse_snowflake(text):
+    text = str(text).strip()
+    if not (text.isascii() and text.isdecimal()):
+        return None
+    value = int(text)
+    return value if 0 < value <= SNOWFLAKE_MAX else None
+
+
+# Position of a month/day in a leap year (1-366), so 02/29 has a slot between 02/28 and 03/01
+def day_of_year(month, day):
+    return datetime.date(2000, month, day).timetuple().tm_yday
+
+
+# The first date on or after today that a birthday at the given day_of_year() position is
+# celebrated; outside leap years, 02/29 birthdays fall on 02/28
+def next_birthday_date(position, today):
+    birthday = datetime.date(2000, 1, 1) + datetime.timedelta(days=position - 1)
+    year = today.year if (birthday.month, birthday.day) >= (today.month, today.day) else today.year + 1
+    if (birthday.month, birthday.day) == (2, 29) and not calendar.isleap(year):
+        return datetime.date(year, 2, 28)
+    return datetime.date(year, birthday.month, birthday.day)
+
+
+# Write text to path atomically: write a temp file in the same directory, then rename over the target
+def write_text_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json_atomic(path, data):
+    write_text_atomic(path, json.dumps(data, indent=4))
+
+
+# Total size of the files that exist among paths
+def size_of_files(paths):
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+# Apply one change to the nested data dicts; value is DELETED for deletions
+def apply_change(data, name, keys, value):
+    node = data[name]
+    for key in keys[:-1]:
+        node = node.setdefault(key, {})
+    if value is DELETED:
+        node.pop(keys[-1], None)
+    else:
+        node[keys[-1]] = value
+
+
+class JsonBackend:
+    """Keeps each data set in its own JSON file and rewrites dirty files on flush."""
+
+    name = "json"
+
+    def __init__(self, directory="."):
+        self.directory = directory
+
+    def path(self, name):
+        return os.path.join(self.directory, DATA_FILES[name])
+
+    # Read every file; missing files start out empty
+    def load(self):
+        data = {}
+        for name in DATA_FILES:
+            path = self.path(name)
+            if os.path.exists(path):
+                with open(path, "r") as file:
+                    data[name] = json.load(file)
+            else:
+                data[name] = {}
+        return data
+
+    def disk_bytes(self):
+        return size_of_files(self.path(name) for name in DATA_FILES)
+
+    # Individual changes are not persisted until the whole file is flushed
+    def apply(self, name, keys, value):
+        pass
+
+    # Serialise the dirty files now (the data keeps changing on the event loop) and return
+    # the disk write for the writer thread; the write returns the number of bytes written
+    def prepare(self, names, data):
+        texts = {name: json.dumps(data[name], indent=4) for name in names}
+
+        def write():
+            for name, text in sorted(texts.items()):
+                write_text_atomic(self.path(name), text)
+            return sum(len(text.encode()) for text in texts.values())
+        return write
+
+    def close(self):
+        pass
+
+
+class SqliteBackend:
+    """Stores birthdays and tracked roles as indexed rows, so a change writes one row."""
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS birthdays (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            birthday TEXT NOT NULL,
+            month INTEGER,
+            day INTEGER,
+            PRIMARY KEY (guild_id, user_id)
+        );
+        CREATE INDEX IF NOT EXISTS birthdays_by_date ON birthdays (guild_id, month, day);
+        CREATE TABLE IF NOT EXISTS user_roles (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            role_id INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, user_id)
+        );
+        CREATE TABLE IF NOT EXISTS guild_roles (
+            guild_id INTEGER PRIMARY KEY,
+            roles TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (guild_id, key)
+        );
+    """
+
+    def __init__(self, path=DATABASE_FILE):
+        self.path = path
+        # Statements queued by apply() and not yet handed to the writer thread
+        self.pending = []
+        self.lock = threading.Lock()
+        # The connection is only used by the writer thread once the bot is running. Other
+        # shard processes may be writing to the same database, so wait for their locks.
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    # Rebuild the same nested dicts the JSON files hold
+    def load(self):
+        data = {name: {} for name in DATA_FILES}
+        for guild_id, roles in self.conn.execute("SELECT guild_id, roles FROM guild_roles"):
+            data["roles"][str(guild_id)] = json.loads(roles)
+        for guild_id, user_id, role_id in self.conn.execute("SELECT guild_id, user_id, role_id FROM user_roles"):
+            data["user_roles"].setdefault(str(guild_id), {})[str(user_id)] = role_id
+        for guild_id, key, value in self.conn.execute("SELECT guild_id, key, value FROM guild_settings"):
+            data["birthdays"].setdefault(str(guild_id), {})[key] = json.loads(value)
+        for guild_id, user_id, birthday in self.conn.execute("SELECT guild_id, user_id, birthday FROM birthdays"):
+            data["birthdays"].setdefault(str(guild_id), {}).setdefault("users", {})[str(user_id)] = birthday
+        return data
+
+    def disk_bytes(self):
+        return size_of_files([self.path, self.path + "-wal"])
+
+    # Translate one Store.set/Store.delete into row writes; value is DELETED for deletions
+    def apply(self, name, keys, value):
+        guild_id = int(keys[0])
+        if name == "roles":
+            if value is DELETED:
+                self._queue("DELETE FROM guild_roles WHERE guild_id = ?", (guild_id,))
+            else:
+                self._queue("INSERT OR REPLACE INTO guild_roles VALUES (?, ?)", (guild_id, json.dumps(value)))
+        elif name == "user_roles":
+            if len(keys) == 1:
+                self._queue("DELETE FROM user_roles WHERE guild_id = ?", (guild_id,))
+                for user_id, role_id in ({} if value is DELETED else value).items():
+                    self._set_user_role(guild_id, user_id, role_id)
+            elif value is DELETED:
+                self._queue("DELETE FROM user_roles WHERE guild_id = ? AND user_id = ?", (guild_id, int(keys[1])))
+            else:
+                self._set_user_role(guild_id, keys[1], value)
+        elif len(keys) == 1:
+            self._queue("DELETE FROM birthdays WHERE guild_id = ?", (guild_id,))
+            self._queue("DELETE FROM guild_settings WHERE guild_id = ?", (guild_id,))
+            for key, setting in ({} if value is DELETED else value).items():
+                self.apply(name, (keys[0], key), setting)
+        elif keys[1] != "users":
+            if value is DELETED:
+                self._queue("DELETE FROM guild_settings WHERE guild_id = ? AND key = ?", (guild_id, keys[1]))
+            else:
+                self._queue("INSERT OR REPLACE INTO guild_settings VALUES (?, ?, ?)", (guild_id, keys[1], json.dumps(value)))
+        elif len(keys) == 2:
+            self._queue("DELETE FROM birthdays WHERE guild_id = ?", (guild_id,))
+            for user_id, birthday in ({} if value is DELETED else value).items():
+                self._set_birthday(guild_id, user_id, birthday)
+        elif value is DELETED:
+            self._queue("DELETE FROM birthdays WHERE guild_id = ? AND user_id = ?", (guild_id, int(keys[2])))
+        else:
+            self._set_birthday(guild_id, keys[2], value)
+
+    def _set_user_role(self, guild_id, user_id, role_id):
+        self._queue("INSERT OR REPLACE INTO user_roles VALUES (?, ?, ?)", (guild_id, int(user_id), role_id))
+
+    def _set_birthday(self, guild_id, user_id, birthday):
+        try:
+            month, day = parse_birthday(birthday)
+        except ValueError:
+            month = day = None
+        self._queue(
+            "INSERT OR REPLACE INTO birthdays VALUES (?, ?, ?, ?, ?)",
+            (guild_id, int(user_id), birthday, month, day),
+        )
+
+    def _queue(self, sql, params):
+        with self.lock:
+            self.pending.append((sql, params))
+
+    # True for errors that mean SQLite can never store this row (an integer beyond 64 bits,
+    # a value of the wrong type), as opposed to a locked or full database
+    @staticmethod
+    def is_unstorable(error):
+        if isinstance(error, (OverflowError, sqlite3.IntegrityError, sqlite3.DataError)):
+            return True
+        return isinstance(error, (sqlite3.InterfaceError, sqlite3.ProgrammingError)) and str(error).startswith("Error binding parameter")
+
+    # Return a job that runs every queued statement in one transaction
+    def prepare(self, names, data):
+        with self.lock:
+            statements, self.pending = self.pending, []
+
+        def write():
+            try:
+                for sql, params in statements:
+                    try:
+                        self.conn.execute(sql, params)
+                    except Exception as e:
+                        if not self.is_unstorable(e):
+                            raise
+                        # Retrying it would fail the same way and hold up every change queued after it
+                        log.error("Dropping a change SQLite cannot store (%s): %s %r", e, sql, params)
+                        STORAGE_DROPPED_CHANGES.inc(backend=self.name)
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                # Put the statements back so the next flush retries them in order
+                with self.lock:
+                    self.pending[:0] = statements
+                raise
+            # SQLite's page writes are not visible here, so report the row payload instead
+            return sum(len(str(param)) for _, params in statements for param in params)
+        return write
+
+    def close(self):
+        self.conn.close()
+
+
+class JournalBackend:
+    """Appends each change to a journal and replays it over the JSON snapshot on load.
+
+    A write costs one appended line instead of a whole-file rewrite. Once the journal passes
+    compact_bytes it is rotated aside and the snapshot files are rewritten on a worker thread;
+    the rotated journal is only deleted after the new snapshot is on disk. Changes are plain
+    set/delete operations, so replaying a journal that the snapshot already covers is harmless.
+    """
+
+    name = "journal"
+
+    def __init__(self, directory=".", journal_file=JOURNAL_FILE, compact_bytes=JOURNAL_COMPACT_BYTES):
+        self.snapshot = JsonBackend(directory)
+        self.journal_path = os.path.join(directory, journal_file)
+        self.rotated_path = self.journal_path + ".compacting"
+        self.compact_bytes = compact_bytes
+        # Records appended by apply() and not yet handed to the writer thread
+        self.pending = []
+        self.lock = threading.Lock()
+        self.size = 0
+        self.file = None
+
+    # Snapshot plus every journal record, without opening the journal for writing
+    def read(self):
+        data = self.snapshot.load()
+        for path in (self.rotated_path, self.journal_path):
+            if os.path.exists(path):
+                self._replay(path, data)
+        return data
+
+    def load(self):
+        data = self.read()
+        # A leftover rotated journal means the last compaction never finished; finish it now
+        if os.path.exists(self.rotated_path):
+            self._write_snapshot({name: json.dumps(data[name], indent=4) for name in DATA_FILES})
+        self.file = open(self.journal_path, "a+")
+        # Terminate a torn final line so the next record starts cleanly
+        if self.file.tell() > 0:
+            self.file.seek(self.file.tell() - 1)
+            if self.file.read(1) != "\n":
+                self.file.write("\n")
+        self.size = self.file.tell()
+        return data
+
+    def disk_bytes(self):
+        return self.snapshot.disk_bytes() + size_of_files([self.journal_path])
+
+    def _replay(self, path, data):
+        with open(path, "r") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn final line from a crash mid-append
+                    log.warning("Skipping unreadable journal record in %s.", path)
+                    continue
+                value = DELETED if record.get("deleted") else record["value"]
+                apply_change(data, record["name"], tuple(record["keys"]), value)
+
+    def apply(self, name, keys, value):
+        if value is DELETED:
+            record = {"name": name, "keys": list(keys), "deleted": True}
+        else:
+            record = {"name": name, "keys": list(keys), "value": value}
+        with self.lock:
+            self.pending.append(json.dumps(record) + "\n")
+
+    # Return a job that appends and fsyncs the queued records, compacting if the journal is too big
+    def prepare(self, names, data):
+        with self.lock:
+            lines, self.pending = self.pending, []
+        self.size += sum(len(line) for line in lines)
+        snapshot = None
+        if self.size >= self.compact_bytes:
+            # Serialise now so the snapshot covers every record written to the rotated journal
+            snapshot = {name: json.dumps(data[name], indent=4) for name in DATA_FILES}
+            self.size = 0
+
+        def write():
+            try:
+                self.file.write("".join(lines))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            except BaseException:
+                with self.lock:
+                    self.pending[:0] = lines
+                raise
+            written = sum(len(line.encode()) for line in lines)
+            if snapshot is not None:
+                self._compact(snapshot)
+                written += sum(len(text.encode()) for text in snapshot.values())
+            return written
+        return write
+
+    # Rotate the journal aside, write the new snapshot, then drop the rotated journal
+    def _compact(self, snapshot):
+        self.file.close()
+        os.replace(self.journal_path, self.rotated_path)
+        self.file = open(self.journal_path, "a")
+        self._write_snapshot(snapshot)
+
+    def _write_snapshot(self, snapshot):
+        for name, text in snapshot.items():
+            write_text_atomic(self.snapshot.path(name), text)
+        os.remove(self.rotated_path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class Store:
+    """Process-wide in-memory copy of the bot's data with debounced flushes to a backend.
+
+    Backends only queue work on the event loop; the disk I/O itself runs on a single writer
+    thread, so the loop never waits on the disk and writes land in the order they were made.
+    """
+
+    def __init__(self, backend, flush_delay=FLUSH_DELAY):
+        self.backend = backend
+        self.flush_delay = flush_delay
+        self.data = {name: {} for name in DATA_FILES}
+        # Birthday indexes, kept in step with every birthday change:
+        #   calendar: (month, day) -> {guild_id: {user_id, ...}}
+        #   by_day: guild_id -> sorted [(day_of_year, user_id), ...]
+        #   versions: guild_id -> counter bumped whenever the guild's birthdays change
+        self.calendar = {}
+        self.by_day = {}
+        self.versions = {}
+        self._dirty = set()
+        self._flush_task = None
+        self._running_sync = None
+        self._next_sync = None
+        self._writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="dino-store")
+
+    # Load everything from the backend, or only the guilds for which keep_guild(guild_id) is true
+    def load(self, keep_guild=None):
+        started = time.perf_counter()
+        self.data = self.backend.load()
+        if keep_guild is not None:
+            self.data = {name: {guild_id: value for guild_id, value in guilds.items() if keep_guild(guild_id)}
+                         for name, guilds in self.data.items()}
+        self._dirty.clear()
+        self.calendar = {}
+        self.by_day = {}
+        for guild_id in self.data["birthdays"]:
+            self._reindex_guild(guild_id)
+        STORAGE_LOAD_SECONDS.set(time.perf_counter() - started, backend=self.backend.name)
+        STORAGE_LOAD_BYTES.set(self.backend.disk_bytes(), backend=self.backend.name)
+
+    # Look up a nested value, e.g. get("birthdays", (guild_id, "users", user_id))
+    def get(self, name, keys, default=None):
+        node = self.data[name]
+        for key in keys:
+            if not isinstance(node, dict) or key not in node:
+                return default
+            node = node[key]
+        return node
+
+    # Set a nested value, creating intermediate dicts as needed
+    def set(self, name, keys, value):
+        before = self._birthdays_under(name, keys)
+        apply_change(self.data, name, keys, value)
+        self.backend.apply(name, keys, value)
+        self.mark_dirty(name)
+        self._reindex(before, self._birthdays_under(name, keys))
+
+    # Set many values below one guild, e.g. {(guild_id, "users", user_id): birthday} for a
+    # bulk import. Each change reaches the backend as usual, but the guild's birthday index is
+    # rebuilt once with a sort instead of being updated change by change.
+    def set_many(self, name, guild_id, changes):
+        # Changes usually share a parent dict, so walk down to each parent only once
+        parents = {}
+        for keys, value in changes.items():
+            if keys[:-1] not in parents:
+                node = self.data[name]
+                for key in keys[:-1]:
+                    node = node.setdefault(key, {})
+                parents[keys[:-1]] = node
+            parents[keys[:-1]][keys[-1]] = value
+            self.backend.apply(name, keys, value)
+        self.mark_dirty(name)
+        if name == "birthdays":
+            self._reindex_guild(guild_id)
+
+    # Delete a nested value; returns False if it was not there
+    def delete(self, name, keys):
+        node = self.get(name, keys[:-1])
+        if not isinstance(node, dict) or keys[-1] not in node:
+            return False
+        before = self._birthdays_under(name, keys)
+        del node[keys[-1]]
+        self.backend.apply(name, keys, DELETED)
+        self.mark_dirty(name)
+        self._reindex(before, {})
+        return True
+
+    # Birthdays stored at or below keys, as {(guild_id, user_id): birthday}
+    def _birthdays_under(self, name, keys):
+        if name != "birthdays" or (len(keys) > 1 and keys[1] != "users"):
+            return {}
+        guild_id = keys[0]
+        if len(keys) == 3:
+            birthday = self.get(name, keys)
+            return {} if birthday is None else {(guild_id, keys[2]): birthday}
+        users = self.get(name, (guild_id, "users"), {})
+        return {(guild_id, user_id): birthday for user_id, birthday in users.items()}
+
+    def _reindex(self, before, after):
+        for guild_id, user_id in before.keys() | after.keys():
+            old, new = before.get((guild_id, user_id)), after.get((guild_id, user_id))
+            if old != new:
+                self._birthday_changed(guild_id, user_id, old, new)
+
+    # Rebuild a guild's calendar and by_day entries from its stored birthdays with one sort,
+    # instead of one insort per birthday
+    def _reindex_guild(self, guild_id):
+        for position, _ in self.by_day.pop(guild_id, []):
+            birthday = datetime.date(2000, 1, 1) + datetime.timedelta(days=position - 1)
+            guilds = self.calendar.get((birthday.month, birthday.day))
+            if guilds is not None:
+                guilds.pop(guild_id, None)
+                if not guilds:
+                    del self.calendar[(birthday.month, birthday.day)]
+        entries = []
+        # At most 366 distinct valid birthdays, so parse each string once
+        parsed = {}
+        for user_id, birthday in self.get("birthdays", (guild_id, "users"), {}).items():
+            if birthday not in parsed:
+                parsed[birthday] = [(month_day, day_of_year(*month_day)) for month_day in self._calendar_day(birthday)]
+            for month_day, position in parsed[birthday]:
+                self.calendar.setdefault(month_day, {}).setdefault(guild_id, set()).add(user_id)
+                entries.append((position, user_id))
+        if entries:
+            entries.sort()
+            self.by_day[guild_id] = entries
+        self.versions[guild_id] = self.versions.get(guild_id, 0) + 1
+
+    # Move a user between calendar days; old/new are "MM/DD" strings or None
+    def _birthday_changed(self, guild_id, user_id, old, new):
+        self.versions[guild_id] = self.versions.get(guild_id, 0) + 1
+        for month_day in self._calendar_day(old):
+            guilds = self.calendar[month_day]
+            guilds[guild_id].discard(user_id)
+            if not guilds[guild_id]:
+                del guilds[guild_id]
+                if not guilds:
+                    del self.calendar[month_day]
+            entries = self.by_day[guild_id]
+            del entries[bisect.bisect_left(entries, (day_of_year(*month_day), user_id))]
+            if not entries:
+                del self.by_day[guild_id]
+        for month_day in self._calendar_day(new):
+            self.calendar.setdefault(month_day, {}).setdefault(guild_id, set()).add(user_id)
+            bisect.insort(self.by_day.setdefault(guild_id, []), (day_of_year(*month_day), user_id))
+
+    # [(month, day)] for a valid birthday string, [] for None or anything unparseable
+    @staticmethod
+    def _calendar_day(birthday):
+        if birthday is None:
+            return []
+        try:
+            month, day = parse_birthday(birthday)
+            day_of_year(month, day)
+        except ValueError:
+            return []
+        return [(month, day)]
+
+    # A guild's birthdays as [(day_of_year, user_id), ...] in upcoming order: the sorted index
+    # rotated so that the given date comes first, without re-sorting anything
+    def upcoming_birthdays(self, guild_id, date):
+        entries = self.by_day.get(str(guild_id), [])
+        start = bisect.bisect_left(entries, (day_of_year(date.month, date.day),))
+        return entries[start:] + entries[:start]
+
+    # The next birthdays in a guild from date on, as [(celebration date, user_id), ...]: at most
+    # count of them, and only those within days of date, when given. Bisects into the sorted
+    # index and walks forward (wrapping into next year), so it costs O(log n + returned).
+    def next_birthdays(self, guild_id, date, count=None, days=None):
+        entries = self.by_day.get(str(guild_id), [])
+        start = bisect.bisect_left(entries, (day_of_year(date.month, date.day),))
+        found = []
+        for index in range(start, start + len(entries)):
+            if count is not None and len(found) >= count:
+                break
+            position, user_id = entries[index % len(entries)]
+            when = next_birthday_date(position, date)
+            if days is not None and (when - date).days > days:
+                break
+            found.append((when, user_id))
+        return found
+
+    # {guild_id: [user_id, ...]} for everyone whose birthday falls on date, or just the list
+    # for one guild if guild_id is given. Outside leap years, 02/29 birthdays are celebrated
+    # on 02/28.
+    def birthdays_on(self, date, guild_id=None):
+        days = [(date.month, date.day)]
+        if days[0] == (2, 28) and not calendar.isleap(date.year):
+            days.append((2, 29))
+        if guild_id is not None:
+            guild_id = str(guild_id)
+            return [user_id for month_day in days for user_id in sorted(self.calendar.get(month_day, {}).get(guild_id, ()))]
+        celebrants = {}
+        for month_day in days:
+            for guild_id, user_ids in self.calendar.get(month_day, {}).items():
+                celebrants.setdefault(guild_id, []).extend(sorted(user_ids))
+        return celebrants
+
+    # Schedule a flush; every change made before it starts is written together
+    def mark_dirty(self, name):
+        self._dirty.add(name)
+        if self._flush_task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. called from a script), so write straight away
+            self.flush()
+            return
+        self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        self._flush_task = None
+        try:
+            await self._write()
+        except Exception:
+            pass # Logged by _write, which has already scheduled the retry
+
+    # Write every dirty data set; on failure, schedule a retry and raise
+    async def _write(self):
+        names, self._dirty = self._dirty, set()
+        try:
+            job = self.backend.prepare(names, self.data) if names else (lambda: 0)
+            await asyncio.get_running_loop().run_in_executor(self._writer, self._timed, job)
+        except Exception as e:
+            log.error("Failed to save %s: %s. Retrying.", ", ".join(sorted(names)), e)
+            STORAGE_SAVE_FAILURES.inc(backend=self.backend.name)
+            for name in names:
+                self.mark_dirty(name)
+            raise
+
+    # Run a backend write job, recording its duration and size
+    def _timed(self, job):
+        with STORAGE_SAVE_SECONDS.time(backend=self.backend.name):
+            written = job()
+        if written:
+            STORAGE_SAVE_BYTES.inc(written, backend=self.backend.name)
+
+    # Wait until every change made so far is on disk. Only needed when a caller must not
+    # continue before the write is durable; everything else can rely on the debounced flush.
+    # Callers that arrive while a durable write is running share the next one. Raises if the
+    # write failed; the changes stay in memory and the background flush keeps retrying them.
+    async def sync(self):
+        if self._next_sync is None:
+            self._next_sync = asyncio.get_running_loop().create_task(self._sync_after(self._running_sync))
+        await asyncio.shield(self._next_sync)
+
+    async def _sync_after(self, previous):
+        if previous is not None:
+            await previous
+        self._running_sync, self._next_sync = self._next_sync, None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._write()
+
+    # Write synchronously on the calling thread; only for use without a running event loop
+    def flush(self):
+        names, self._dirty = self._dirty, set()
+        if names:
+            self._timed(self.backend.prepare(names, self.data))
+
+    # Finish queued writes and release the backend; called once the event loop has stopped
+    def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._writer.shutdown(wait=True)
+        self.flush()
+        self.backend.close()
+
+
+# Create the backend selected by DINO_STORAGE
+def create_backend(kind=STORAGE_BACKEND):
+    if kind == "json":
+        return JsonBackend()
+    if kind == "sqlite":
+        return SqliteBackend(DATABASE_FILE)
+    if kind == "journal":
+        return JournalBackend()
+    raise ValueError(f"Unknown storage backend {kind!r} (expected 'json', 'sqlite' or 'journal')")
+
+
+# Copy roles.json, user_roles.json and birthdays.json (plus any journal) into the SQLite database
+def migrate_json_to_sqlite(directory=".", database=DATABASE_FILE):
+    data = JournalBackend(directory).read()
+    backend = SqliteBackend(database)
+    try:
+        for name, guilds in data.items():
+            for guild_id, value in guilds.items():
+                backend.apply(name, (guild_id,), value)
+        backend.prepare(DATA_FILES, data)()
+    finally:
+        backend.close()
+    return {name: len(guilds) for name, guilds in data.items()}
+
+
+store = Store(create_backend())
+
+# --- Role Management (roles.json) ---
 # Fetch roles for a specific server
 def get_roles_for_guild(guild_id):
-    roles_data = load_roles()
-    return roles_data.get(str(guild_id), [])
+    return list(store.get("roles", (str(guild_id),), []))
 
 # Update roles for a specific server
 def update_roles_for_guild(guild_id, roles):
-    roles_data = load_roles()
-    roles_data[str(guild_id)] = roles
-    save_roles(roles_data)
+    store.set("roles", (str(guild_id),), roles)
 
 # --- User Role Tracking (user_roles.json) ---
-# Load user role data from the user_roles.json file
-def load_user_roles():
-    if os.path.exists("user_roles.json"):
-        with open("user_roles.json", "r") as file:
-            return json.load(file)
-    return {}
-
-# Save user role data to the user_roles.json file
-def save_user_roles(data):
-    with open("user_roles.json", "w") as file:
-        json.dump(data, file, indent=4)
-
 # Get the role a user currently has from the managed roles
 def get_user_current_managed_role(guild_id, user_id):
-    user_roles_data = load_user_roles()
-    return user_roles_data.get(str(guild_id), {}).get(str(user_id))
+    return store.get("user_roles", (str(guild_id), str(user_id)))
 
 # Set the role a user currently has from the managed roles
 def set_user_current_managed_role(guild_id, user_id, role_id):
-    user_roles_data = load_user_roles()
-    if str(guild_id) not in user_roles_data:
-        user_roles_data[str(guild_id)] = {}
-    user_roles_data[str(guild_id)][str(user_id)] = role_id
-    save_user_roles(user_roles_data)
+    store.set("user_roles", (str(guild_id), str(user_id)), role_id)
 
 # Clear the user's current managed role (e.g., if they no longer have any)
 def clear_user_current_managed_role(guild_id, user_id):
-    user_roles_data = load_user_roles()
-    if str(guild_id) in user_roles_data and str(user_id) in user_roles_data[str(guild_id)]:
-        del user_roles_data[str(guild_id)][str(user_id)]
-        save_user_roles(user_roles_data)
+    store.delete("user_roles", (str(guild_id), str(user_id)))
 
 # --- Birthday Management (birthdays.json) ---
-# Load birthday data from the birthdays.json file
-def load_birthdays():
-    if os.path.exists("birthdays.json"):
-        with open("birthdays.json", "r") as file:
-            return json.load(file)
-    return {}
-
-# Save birthday data to the birthdays.json file
-def save_birthdays(data):
-    with open("birthdays.json", "w") as file:
-        json.dump(data, file, indent=4)
-
 # Get birthday embed details for a guild
 def get_birthday_embed_info(guild_id):
-    birthdays_data = load_birthdays()
-    return birthdays_data.get(str(guild_id), {}).get("embed_info")
-
-# Set birthday embed details for a guild
-def set_birthday_embed_info(guild_id, channel_id, message_id):
-    birthdays_data = load_birthdays()
-    if str(guild_id) not in birthdays_data:
-        birthdays_data[str(guild_id)] = {}
-    birthdays_data[str(guild_id)]["embed_info"] = {"channel_id": channel_id, "message_id": message_id}
-    save_birthdays(birthdays_data)
+    return store.get("birthdays", (str(guild_id), "embed_info"))
+
+# Set birthday embed details for a guild: one message per page of the list, and for each
+# page a hash of what that message currently shows
+def set_birthday_embed_info(guild_id, channel_id, message_ids, content_hashes=None):
+    message_ids = list(message_ids or [])
+    content_hashes = list(content_hashes or [None] * len(message_ids))
+    store.set("birthdays", (str(guild_id), "embed_info"), {"channel_id": channel_id, "message_ids": message_ids, "content_hashes": content_hashes})
+
+# Message IDs of a guild's birthday list pages, oldest first
+def get_birthday_embed_message_ids(embed_info):
+    if not embed_info:
+        return []
+    if "message_ids" in embed_info:
+        return embed_info["message_ids"]
+    # Embed info saved before the list was paginated
+    return [embed_info["message_id"]] if embed_info.get("message_id") else []
+
+# Get all birthdays for a guild as {user_id_str: "MM/DD"}
+def get_guild_birthdays(guild_id):
+    return store.get("birthdays", (str(guild_id), "users"), {})
 
 # Get a user's birthday
 def get_user_birthday(guild_id, user_id):
-    birthdays_data = load_birthdays()
-    return birthdays_data.get(str(guild_id), {}).get("users", {}).get(str(user_id))
+    return store.get("birthdays", (str(guild_id), "users", str(user_id)))
 
 # Set a user's birthday
 def set_user_birthday(guild_id, user_id, birthday):
-    birthdays_data = load_birthdays()
-    if str(guild_id) not in birthdays_data:
-        birthdays_data[str(guild_id)] = {"users": {}}
-    if "users" not in birthdays_data[str(guild_id)]:
-        birthdays_data[str(guild_id)]["users"] = {}
-    birthdays_data[str(guild_id)]["users"][str(user_id)] = birthday
-    save_birthdays(birthdays_data)
+    store.set("birthdays", (str(guild_id), "users", str(user_id)), birthday)
+
+# Set many users' birthdays in a guild at once from {user_id: "MM/DD"}
+def set_user_birthdays(guild_id, birthdays):
+    guild_id = str(guild_id)
+    store.set_many("birthdays", guild_id, {(guild_id, "users", str(user_id)): birthday for user_id, birthday in birthdays.items()})
+
+# Remove a user's birthday
+def remove_user_birthday(guild_id, user_id):
+    return store.delete("birthdays", (str(guild_id), "users", str(user_id)))
 
 # Get the birthday channel ID for a guild
 def get_birthday_channel_id(guild_id):
-    birthdays_data = load_birthdays()
-    return birthdays_data.get(str(guild_id), {}).get("birthday_channel_id")
+    return store.get("birthdays", (str(guild_id), "birthday_channel_id"))
 
 # Set the birthday channel ID for a guild
 def set_birthday_channel_id(guild_id, channel_id):
-    birthdays_data = load_birthdays()
-    if str(guild_id) not in birthdays_data:
-        birthdays_data[str(guild_id)] = {}
-    birthdays_data[str(guild_id)]["birthday_channel_id"] = channel_id
-    save_birthdays(birthdays_data)
+    store.set("birthdays", (str(guild_id), "birthday_channel_id"), channel_id)
+
+# Get the timezone a guild's birthdays are checked in, falling back to DEFAULT_TIMEZONE
+def get_guild_timezone(guild_id):
+    name = store.get("birthdays", (str(guild_id), "timezone")) or DEFAULT_TIMEZONE
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        log.warning("Unknown timezone %r for guild %s. Using %s.", name, guild_id, DEFAULT_TIMEZONE, extra={"guild_id": guild_id})
+        return zoneinfo.ZoneInfo(DEFAULT_TIMEZONE)
+
+# Set the timezone (an IANA name such as "Europe/Berlin") for a guild
+def set_guild_timezone(guild_id, timezone_name):
+    store.set("birthdays", (str(guild_id), "timezone"), timezone_name)
+
+# Get a guild's greeting template, or None for DEFAULT_GREETING_TEMPLATE
+def get_greeting_template(guild_id):
+    return store.get("birthdays", (str(guild_id), "greeting_template"))
+
+# Set a guild's greeting template (None restores the default)
+def set_greeting_template(guild_id, template):
+    store.set("birthdays", (str(guild_id), "greeting_template"), template)
+
+# Whether a guild greets all of the day's celebrants in one message, falling back to GREETING_MODE
+def greets_in_batches(guild_id):
+    mode = store.get("birthdays", (str(guild_id), "greeting_mode")) or GREETING_MODE
+    return mode == "batched"
+
+def set_greeting_mode(guild_id, mode):
+    store.set("birthdays", (str(guild_id), "greeting_mode"), mode)
+
+# Get the last local date the daily birthday check completed for a guild
+def get_last_birthday_check(guild_id):
+    value = store.get("birthdays", (str(guild_id), "last_birthday_check"))
+    return datetime.date.fromisoformat(value) if value else None
+
+# Record that the daily birthday check completed for a guild's local date
+def set_last_birthday_check(guild_id, date):
+    store.set("birthdays", (str(guild_id), "last_birthday_check"), date.isoformat())
+
+# --- Guild Transactions ---
+# The helpers above are safe on their own, but a handler that reads stored data, awaits Discord
+# and then writes back could act on a stale read if another interaction ran in between. Such
+# sequences run inside guild_transaction, which serialises them per guild. A transaction covers
+# the whole guild unless scope narrows it to one member (by ID) or one feature (e.g.
+# "role_picker"), so unrelated updates in a busy guild still run side by side.
+# (guild_id, scope) -> [lock, number of tasks holding or waiting for it]
+guild_locks = {}
+
+@contextlib.asynccontextmanager
+async def guild_transaction(guild_id, scope=None):
+    key = (int(guild_id), scope)
+    entry = guild_locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        # Drop idle locks so one per member does not pile up
+        if entry[1] == 0:
+            del guild_locks[key]
+
+# --- Event Loop Watchdog ---
+# Anything that blocks the event loop (disk I/O, heavy CPU) also delays gateway heartbeats and
+# every other guild's interactions. The watchdog sleeps in short steps and logs whenever it
+# wakes up later than LOOP_BLOCK_THRESHOLD seconds past its deadline. Set it to 0 to disable.
+LOOP_BLOCK_THRESHOLD = float(os.getenv('DINO_LOOP_BLOCK_THRESHOLD', '0.1'))
+LOOP_WATCHDOG_INTERVAL = 0.5
+loop_watchdog_task = None
+
+async def watch_event_loop(threshold, interval=LOOP_WATCHDOG_INTERVAL):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = loop.time() - started - interval
+        if lag > threshold:
+            log.warning("Event loop was blocked for %.0f ms (threshold %.0f ms).", lag * 1000, threshold * 1000, extra={"lag_seconds": lag})
+
+# --- Command Tree Sync ---
+# Hash of everything Discord knows about our slash commands, independent of definition order
+def command_tree_hash(tree):
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def read_command_tree_hash():
+    try:
+        with open(COMMAND_HASH_FILE, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+async def sync_command_tree(force=False):
+    """Syncs the global command tree, skipping the rate-limited call if nothing changed since the last sync."""
+    current = command_tree_hash(bot.tree)
+    if not force and read_command_tree_hash() == current:
+        log.info("Slash commands unchanged since the last sync; skipping tree sync.")
+        return
+    try:
+        synced = await bot.tree.sync()
+    except discord.HTTPException as e:
+        # Keep running with the commands Discord already has; the next start retries
+        log.error("Failed to sync slash commands: %s", e)
+        return
+    await asyncio.to_thread(write_text_atomic, COMMAND_HASH_FILE, current)
+    log.info("Synced %d slash commands.", len(synced))
 
 # --- Bot Events and Commands ---
+# Runs once per process, before connecting to the gateway; on_ready fires again after
+# every reconnect, so one-off startup work belongs here
+async def setup_hook():
+    global loop_watchdog_task, memory_report_task, metrics_runner
+    # Picker messages posted before a restart keep working: their custom IDs are routed here
+    bot.add_view(RolePickerView.persistent())
+    # Commands are global, so only the process running shard 0 syncs them
+    if bot.shard_ids is None or 0 in bot.shard_ids:
+        await sync_command_tree(force=force_command_sync)
+    if LOOP_BLOCK_THRESHOLD > 0:
+        loop_watchdog_task = asyncio.create_task(watch_event_loop(LOOP_BLOCK_THRESHOLD))
+    # Start the daily birthday scheduler; it waits for the guild cache to be ready itself
+    birthday_scheduler.start()
+    if MEMORY_REPORT_INTERVAL > 0:
+        memory_report_task = asyncio.create_task(report_memory_periodically(MEMORY_REPORT_INTERVAL))
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+bot.setup_hook = setup_hook
+
 @bot.event
 async def on_ready():
-    print(f"Bot is logged in as {bot.user}")        
-    await bot.tree.sync()
-    print(f'Logged in as {bot.user}')
-    # Start the birthday check loop when the bot is ready
-    birthday_check.start()  
+    log.info("Logged in as %s", bot.user)
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    observe_command(interaction, "ok")
+
+@bot.event
+async def on_user_update(before: discord.User, after: discord.User):
+    # Birthday lists show usernames, so a rename makes the cached list stale
+    if before.name != after.name:
+        for guild in after.mutual_guilds:
+            invalidate_birthday_render(guild.id)
+
+# --- Departed Members and Guilds ---
+# Data for members and guilds the bot can no longer see is dropped as soon as Discord tells
+# us they are gone, plus one reconciliation pass at startup for anything missed while offline.
+# Rendering the birthday list therefore never has to prune anything.
+
+# Forget a member's birthday and tracked role; returns True if they had a birthday stored
+def forget_member(guild_id, user_id):
+    clear_user_current_managed_role(guild_id, user_id)
+    return remove_user_birthday(guild_id, user_id)
+
+# Forget everything stored for a guild
+def forget_guild(guild_id):
+    for name in DATA_FILES:
+        store.delete(name, (str(guild_id),))
+    invalidate_birthday_render(guild_id)
+    invalidate_role_options(int(guild_id))
+    for key in [key for key in member_lookup_cache if key[0] == int(guild_id)]:
+        del member_lookup_cache[key]
+
+def reconcile_stores():
+    """
+    Drops stored data for guilds the bot is no longer in, members who have left, birthdays
+    in an invalid format and tracked roles that no longer exist. Guilds whose member list
+    is not fully cached are skipped, since a missing member there proves nothing.
+    """
+    removed = 0
+    for name in DATA_FILES:
+        for guild_id in list(store.data[name]):
+            if bot.get_guild(int(guild_id)) is None:
+                forget_guild(guild_id)
+                removed += 1
+
+    for guild_id in list(store.data["birthdays"]):
+        guild = bot.get_guild(int(guild_id))
+        if not guild or not guild.chunked:
+            continue
+        for user_id_str, birthday_str in list(get_guild_birthdays(guild_id).items()):
+            if guild.get_member(int(user_id_str)) is None or not Store._calendar_day(birthday_str):
+                remove_user_birthday(guild_id, user_id_str)
+                removed += 1
+
+    for guild_id, tracked in list(store.data["user_roles"].items()):
+        guild = bot.get_guild(int(guild_id))
+        if not guild or not guild.chunked:
+            continue
+        for user_id_str, role_id in list(tracked.items()):
+            if guild.get_member(int(user_id_str)) is None or guild.get_role(role_id) is None:
+                clear_user_current_managed_role(guild_id, user_id_str)
+                removed += 1
+
+    log.info("Startup reconciliation removed %d stale entries.", removed, extra={"removed": removed})
+
+async def prefetch_tracked_members():
+    """
+    Under the tracked cache policy, fetches the members with a stored birthday or role into the
+    cache, guild by guild. The lookup also tells us exactly who has left, so they are forgotten.
+    """
+    for guild in list(bot.guilds):
+        user_ids = {int(user_id) for user_id in get_guild_birthdays(guild.id)}
+        user_ids.update(int(user_id) for user_id in store.get("user_roles", (str(guild.id),), {}))
+        if not user_ids:
+            continue
+        _, departed = await resolve_members(guild, list(user_ids))
+        forgotten = [user_id for user_id in departed if forget_member(guild.id, user_id)]
+        if forgotten:
+            schedule_birthday_embed_update(guild)
+    log.info("Fetched tracked members of %d guilds.", len(bot.guilds))
+    log_memory_report()
+
+# Resident set size of this process in bytes (peak RSS where /proc is not available)
+def resident_memory():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def memory_report():
+    return {
+        "policy": MEMBER_CACHE_POLICY,
+        "rss_bytes": resident_memory(),
+        "guilds": len(bot.guilds),
+        "cached_members": sum(len(guild.members) for guild in bot.guilds),
+        "cached_users": len(bot.users),
+        "member_lru": len(member_lookup_cache),
+    }
+
+def log_memory_report():
+    report = memory_report()
+    log.info("Memory: %.1f MiB RSS with member cache policy '%s' (%d cached members, %d users, "
+             "%d in lookup LRU, %d guilds).", report["rss_bytes"] / 2**20, report["policy"], report["cached_members"],
+             report["cached_users"], report["member_lru"], report["guilds"], extra=report)
+
+memory_report_task = None
+
+async def report_memory_periodically(interval):
+    await bot.wait_until_ready()
+    while True:
+        log_memory_report()
+        await asyncio.sleep(interval)
+
+# The raw event fires whether or not the member was cached
+@bot.event
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent):
+    member_lookup_cache.pop((payload.guild_id, payload.user.id), None)
+    guild = bot.get_guild(payload.guild_id)
+    if forget_member(payload.guild_id, payload.user.id) and guild:
+        schedule_birthday_embed_update(guild)
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    log.info("Removed from guild %s. Forgetting its data.", guild.name, extra={"guild_id": guild.id})
+    forget_guild(guild.id)
+
+# --- Role Switching ---
+# Discord allows at most 25 options per select and 5 selects per message
+SELECT_OPTION_LIMIT = 25
+SELECTS_PER_MESSAGE = 5
+# Custom IDs of the selects on role picker messages. The chosen role ID arrives with the
+# interaction, so one registered view can serve every guild's picker message.
+ROLE_PICKER_CUSTOM_ID = "dino:role_picker:{}"
+ROLE_PICKER_PROMPT = "Pick a role to switch to:"
+
+# (guild_id, user_id) -> [Member returned by our last role edit, clicks in flight]. Discord
+# sends a new Member with every interaction, taken when it was clicked, so a click that waited
+# on the one before it carries roles that edit has already replaced.
+role_switch_members = {}
+
+# Switch the user who made the interaction to the given managed role (or toggle it off)
+async def switch_managed_role(interaction: discord.Interaction, role_id_new: int):
+    rest_call_site.set("role_switch") # Runs in its own task per component interaction
+    key = (interaction.guild.id, interaction.user.id)
+    entry = role_switch_members.setdefault(key, [None, 0])
+    entry[1] += 1
+    try:
+        # Role edits can take a while under rate limits, and so can waiting for this member's last click
+        await defer(interaction)
+        # Overlapping clicks by the same member would otherwise act on each other's stale roles.
+        # The answer is sent after the lock is released, so the next click does not wait on it.
+        async with guild_transaction(interaction.guild.id, interaction.user.id):
+            message = await _switch_managed_role(interaction, role_id_new, entry)
+    finally:
+        entry[1] -= 1
+        # Clicks made after the last edit carry its roles already
+        if entry[1] == 0:
+            del role_switch_members[key]
+    await interaction.followup.send(message, ephemeral=True)
+
+# Apply the role switch for the interaction user; returns the answer for them
+async def _switch_managed_role(interaction: discord.Interaction, role_id_new: int, entry):
+    guild = interaction.guild
+    guild_id = guild.id
+    # Start from the freshest roles we know of: our own last edit, then the member cache,
+    # and only then the roles this interaction was sent with
+    member = entry[0] or guild.get_member(interaction.user.id) or interaction.user
+
+    # Get the new role object (a dict lookup, not a scan of every role)
+    new_role = guild.get_role(role_id_new)
+    
+    if not new_role:
+        return "The selected role was not found on this server."
+
+    previous_managed_role_id = get_user_current_managed_role(guild_id, member.id)
+    # Every configured role goes, not just the tracked one, so the member never ends up with two
+    switchable_ids = {stored['id'] for stored in get_roles_for_guild(guild_id)}
+    kept = [role for role in member.roles if not role.is_default() and role.id not in switchable_ids]
+    previous_roles = [role for role in member.roles if role.id in switchable_ids and role != new_role]
+
+    # Check if the user already has the new role
+    if member.get_role(new_role.id):
+        # If they have it, remove it (toggle off)
+        try:
+            entry[0] = await member.edit(roles=kept)
+        except discord.Forbidden:
+            return "Could not remove the role (permissions issue)."
+        except Exception as e:
+            return f"Error removing the role: {e}."
+        # If the role being removed is the one we were tracking, clear it
+        if previous_managed_role_id == new_role.id:
+            clear_user_current_managed_role(guild_id, member.id)
+        return f"Removed {new_role.name} from you."
+
+    # Swap the previous managed role for the new one in a single request, so the user
+    # never ends up holding both roles or neither
+    try:
+        entry[0] = await member.edit(roles=kept + [new_role])
+    except discord.Forbidden:
+        return "Could not switch roles (permissions issue)."
+    except Exception as e:
+        return f"Error switching roles: {e}."
+
+    set_user_current_managed_role(guild_id, member.id, new_role.id)
+    remove_message = f"Removed previous role: {', '.join(role.name for role in previous_roles)}. " if previous_roles else ""
+    return f"{remove_message}Added {new_role.name} to you."
+
+# guild_id -> dropdown options for that guild's switchable roles. Built from the live roles,
+# kept current by the role update/delete events and dropped when the role list changes.
+role_option_cache = {}
+
+def invalidate_role_options(guild_id):
+    role_option_cache.pop(guild_id, None)
+
+# Dropdown options for a guild's switchable roles, using the roles' current names
+def role_select_options(guild: discord.Guild):
+    options = role_option_cache.get(guild.id)
+    if options is None:
+        options = []
+        for stored in get_roles_for_guild(guild.id):
+            role = guild.get_role(stored['id'])
+            if role is None:
+                continue # Deleted since it was added; on_guild_role_delete removes it for good
+            options.append(discord.SelectOption(label=role.name, value=str(role.id), emoji=None))
+        role_option_cache[guild.id] = options
+    return options
+
+# Remember a configured role's current name and colour, e.g. after it was edited
+def update_stored_role(guild_id, role: discord.Role):
+    roles = get_roles_for_guild(guild_id)
+    for index, stored in enumerate(roles):
+        if stored['id'] == role.id:
+            roles[index] = {"id": role.id, "name": role.name, "color": str(role.color)}
+            update_roles_for_guild(guild_id, roles)
+            return True
+    return False
+
+class RolePickerSelect(Select):
+    async def callback(self, interaction: discord.Interaction):
+        interaction.extras["started"] = time.perf_counter()
+        # Read the choice from this interaction: the registered item is shared by every
+        # picker message, so its own .values may already belong to another click
+        await switch_managed_role(interaction, int(interaction.data["values"][0]))
+
+class RolePickerView(View):
+    """Role dropdowns that never time out, one select per page of up to 25 roles."""
+
+    def __init__(self, pages, first_page=0, total_pages=None):
+        super().__init__(timeout=None)
+        total_pages = total_pages or len(pages)
+        for index, options in enumerate(pages):
+            placeholder = "Choose a role to switch to"
+            if total_pages > 1:
+                placeholder += f" ({first_page + index + 1}/{total_pages})"
+            self.add_item(RolePickerSelect(
+                custom_id=ROLE_PICKER_CUSTOM_ID.format(index),
+                placeholder=placeholder,
+                options=options,
+            ))
+
+    # The view registered at startup so picker messages keep working across restarts
+    @classmethod
+    def persistent(cls):
+        return cls([[] for _ in range(SELECTS_PER_MESSAGE)])
+
+# Split options into views of at most SELECTS_PER_MESSAGE selects of SELECT_OPTION_LIMIT options each
+def build_role_picker_views(options):
+    pages = [options[i:i + SELECT_OPTION_LIMIT] for i in range(0, len(options), SELECT_OPTION_LIMIT)]
+    return [
+        RolePickerView(pages[i:i + SELECTS_PER_MESSAGE], first_page=i, total_pages=len(pages))
+        for i in range(0, len(pages), SELECTS_PER_MESSAGE)
+    ]
 
 @bot.tree.command(name="roles", description="Switch between server roles")
 async def roles(interaction: discord.Interaction):
-    # Fetch all roles from the server stored in roles.json
-    guild_id = interaction.guild.id
-    roles = get_roles_for_guild(guild_id)
+    # Dropdown options come from the in-memory cache of the guild's switchable roles
+    options = role_select_options(interaction.guild)
 
-    if not roles:
-        await interaction.response.send_message("No roles are available to switch to.", ephemeral=True)
+    if not options:
+        await reply(interaction, "No roles are available to switch to.", ephemeral=True)
         return
 
-    # Prepare options for the dropdown
-    options = [
-        discord.SelectOption(
-            label=role['name'], 
-            value=str(role['id']), 
-            emoji=None
-        )
-        for role in roles
-    ]
-    
-    # Create the dropdown
-    select = Select(
-        placeholder="Choose a role to switch to",
-        options=options
-    )
+    views = build_role_picker_views(options)
+    await reply(interaction, "Please select a role from the dropdown:", view=views[0], ephemeral=True)
+    for view in views[1:]:
+        await interaction.followup.send("More roles:", view=view, ephemeral=True)
 
-    async def select_callback(interaction: discord.Interaction):
-        role_id_new = int(select.values[0])  # Get the selected role ID
-        member = interaction.user
-        guild_id = interaction.guild.id
-        
-        # Get the new role object
-        new_role = discord.utils.get(interaction.guild.roles, id=role_id_new)
-        
-        if not new_role:
-            await interaction.response.send_message("The selected role was not found on this server.", ephemeral=True)
-            return
+# Get the channel and messages of a guild's persistent role picker
+def get_role_picker_info(guild_id):
+    # Kept with the other per-guild settings in birthdays.json
+    return store.get("birthdays", (str(guild_id), "role_picker"))
 
-        # Get the user's previously assigned managed role
-        previous_managed_role_id = get_user_current_managed_role(guild_id, member.id)
-        previous_managed_role = None
-        if previous_managed_role_id:
-            previous_managed_role = discord.utils.get(interaction.guild.roles, id=previous_managed_role_id)
-
-        # Check if the user already has the new role
-        if new_role in member.roles:
-            # If they have it, remove it (toggle off)
-            await member.remove_roles(new_role)
-            # If the role being removed is the one we were tracking, clear it
-            if previous_managed_role and previous_managed_role.id == new_role.id:
-                clear_user_current_managed_role(guild_id, member.id)
-            await interaction.response.send_message(f"Removed {new_role.name} from you.", ephemeral=True)
-            return
+# Set the channel and messages of a guild's persistent role picker
+def set_role_picker_info(guild_id, channel_id, message_ids):
+    if channel_id is None:
+        store.delete("birthdays", (str(guild_id), "role_picker"))
+    else:
+        store.set("birthdays", (str(guild_id), "role_picker"), {"channel_id": channel_id, "message_ids": list(message_ids)})
 
-        # If the user has a previous managed role and it's different from the new role
-        if previous_managed_role and previous_managed_role.id != new_role.id:
-            try:
-                await member.remove_roles(previous_managed_role)
-                remove_message = f"Removed previous role: {previous_managed_role.name}. "
-            except discord.Forbidden:
-                remove_message = "Could not remove previous role (permissions issue). "
-            except Exception as e:
-                remove_message = f"Error removing previous role: {e}. "
+async def refresh_role_picker(guild: discord.Guild):
+    """Brings a guild's posted role picker in line with its current role list."""
+    # Overlapping refreshes could both post the same missing page
+    async with guild_transaction(guild.id, "role_picker"):
+        await _refresh_role_picker(guild)
+
+async def _refresh_role_picker(guild: discord.Guild):
+    info = get_role_picker_info(guild.id)
+    if not info:
+        return
+    channel = guild.get_channel(info["channel_id"])
+    if not channel:
+        set_role_picker_info(guild.id, None, None)
+        return
+
+    views = build_role_picker_views(role_select_options(guild))
+    message_ids = list(info["message_ids"])
+    try:
+        if not views:
+            # No roles left: keep the first message as a notice instead of an empty picker
+            await channel.get_partial_message(message_ids[0]).edit(content="No roles are available to switch to.", view=None)
+            views_needed = 1
         else:
-            remove_message = ""
+            for index, view in enumerate(views):
+                content = ROLE_PICKER_PROMPT if index == 0 else None
+                if index < len(message_ids):
+                    await channel.get_partial_message(message_ids[index]).edit(content=content, view=view)
+                else:
+                    message = await channel.send(content=content, view=view)
+                    message_ids.append(message.id)
+            views_needed = len(views)
+        # The role list shrank: remove the messages it no longer needs
+        for message_id in message_ids[views_needed:]:
+            await channel.get_partial_message(message_id).delete()
+        set_role_picker_info(guild.id, channel.id, message_ids[:views_needed])
+    except discord.NotFound:
+        log.info("Role picker message in guild %s was deleted. Forgetting it.", guild.name, extra={"guild_id": guild.id})
+        set_role_picker_info(guild.id, None, None)
+    except discord.HTTPException as e:
+        log.error("Error refreshing role picker in guild %s: %s", guild.name, e, extra={"guild_id": guild.id})
 
-        # Add the new role
-        try:
-            await member.add_roles(new_role)
-            set_user_current_managed_role(guild_id, member.id, new_role.id)
-            await interaction.response.send_message(f"{remove_message}Added {new_role.name} to you.", ephemeral=True)
-        except discord.Forbidden:
-            await interaction.response.send_message("Could not add the new role (permissions issue).", ephemeral=True)
-        except Exception as e:
-            await interaction.response.send_message(f"Error adding new role: {e}.", ephemeral=True)
-    
-    select.callback = select_callback
-    view = View()
-    view.add_item(select)
-    
-    await interaction.response.send_message("Please select a role from the dropdown:", view=view, ephemeral=True)
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    # Keep dropdowns showing the role's current name
+    if (before.name, before.color) == (after.name, after.color):
+        return
+    if update_stored_role(after.guild.id, after):
+        invalidate_role_options(after.guild.id)
+        if before.name != after.name:
+            await refresh_role_picker(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    # A deleted role can no longer be picked, so drop it from the dropdown
+    roles = get_roles_for_guild(role.guild.id)
+    remaining = [stored for stored in roles if stored['id'] != role.id]
+    if len(remaining) != len(roles):
+        update_roles_for_guild(role.guild.id, remaining)
+        invalidate_role_options(role.guild.id)
+    # Nobody holds the role any more, so stop tracking it
+    tracked = store.get("user_roles", (str(role.guild.id),), {})
+    for user_id_str, role_id in list(tracked.items()):
+        if role_id == role.id:
+            clear_user_current_managed_role(role.guild.id, user_id_str)
+    if len(remaining) != len(roles):
+        await refresh_role_picker(role.guild)
+
+@bot.tree.command(name="post_role_picker", description="Post a permanent role switch menu that anyone can use")
+@app_commands.checks.has_permissions(manage_roles=True)  # Use manage_roles for moderator access
+@app_commands.describe(channel="The channel where the role picker should be posted.")
+async def post_role_picker(interaction: discord.Interaction, channel: discord.TextChannel):
+    options = role_select_options(interaction.guild)
+    if not options:
+        await reply(interaction, "No roles are available to switch to. Add some with /add_role first.", ephemeral=True)
+        return
+
+    await defer(interaction)
+    async with guild_transaction(interaction.guild.id, "role_picker"):
+        await _post_role_picker(interaction, channel, options)
+
+async def _post_role_picker(interaction: discord.Interaction, channel: discord.TextChannel, options):
+    # Replace any picker posted earlier
+    previous = get_role_picker_info(interaction.guild.id)
+    if previous:
+        old_channel = interaction.guild.get_channel(previous["channel_id"])
+        for message_id in previous["message_ids"] if old_channel else []:
+            try:
+                await old_channel.get_partial_message(message_id).delete()
+            except discord.HTTPException:
+                pass
+
+    message_ids = []
+    try:
+        for index, view in enumerate(build_role_picker_views(options)):
+            content = ROLE_PICKER_PROMPT if index == 0 else None
+            message = await channel.send(content=content, view=view)
+            message_ids.append(message.id)
+    except discord.Forbidden:
+        await interaction.followup.send(f"I don't have permission to send messages in {channel.mention}.", ephemeral=True)
+        return
+    finally:
+        set_role_picker_info(interaction.guild.id, channel.id if message_ids else None, message_ids)
+
+    await interaction.followup.send(f"Role picker posted in {channel.mention}.", ephemeral=True)
 
 @bot.tree.command(name="add_role", description="Add a role to the role switch dropdown")
-@has_permissions(manage_roles=True)  # Use manage_roles for moderator access
+@app_commands.checks.has_permissions(manage_roles=True)  # Use manage_roles for moderator access
 async def add_role(interaction: discord.Interaction, role: discord.Role):
     guild_id = interaction.guild.id
-    roles = get_roles_for_guild(guild_id)
+    async with guild_transaction(guild_id):
+        roles = get_roles_for_guild(guild_id)
 
-    # Check if the role is already added
-    if any(r['id'] == role.id for r in roles):
-        await interaction.response.send_message(f"{role.name} is already in the dropdown.", ephemeral=True)
-        return
+        # Check if the role is already added
+        if any(r['id'] == role.id for r in roles):
+            await reply(interaction, f"{role.name} is already in the dropdown.", ephemeral=True)
+            return
 
-    # Add the new role to the roles list
-    roles.append({"id": role.id, "name": role.name, "color": str(role.color)})
-    update_roles_for_guild(guild_id, roles)
-    
-    await interaction.response.send_message(f"Added {role.name} to the dropdown.", ephemeral=True)
+        # Add the new role to the roles list
+        roles.append({"id": role.id, "name": role.name, "color": str(role.color)})
+        update_roles_for_guild(guild_id, roles)
+        invalidate_role_options(guild_id)
+
+    await reply(interaction, f"Added {role.name} to the dropdown.", ephemeral=True)
+    run_in_background(interaction, refresh_role_picker(interaction.guild))
 
 @bot.tree.command(name="remove_role", description="Remove a role from the role switch dropdown")
-@has_permissions(manage_roles=True)  # Use manage_roles for moderator access
+@app_commands.checks.has_permissions(manage_roles=True)  # Use manage_roles for moderator access
 async def remove_role(interaction: discord.Interaction, role: discord.Role):
     guild_id = interaction.guild.id
-    roles = get_roles_for_guild(guild_id)
-
-    # Find and remove the role from the list
-    role_to_remove = next((r for r in roles if r['id'] == role.id), None)
+    async with guild_transaction(guild_id):
+        roles = get_roles_for_guild(guild_id)
+
+        # Find and remove the role from the list
+        role_to_remove = next((r for r in roles if r['id'] == role.id), None)
+        if role_to_remove:
+            roles.remove(role_to_remove)
+            update_roles_for_guild(guild_id, roles)
+            invalidate_role_options(guild_id)
     if role_to_remove:
-        roles.remove(role_to_remove)
-        update_roles_for_guild(guild_id, roles)
-        await interaction.response.send_message(f"Removed {role.name} from the dropdown.", ephemeral=True)
+        await reply(interaction, f"Removed {role.name} from the dropdown.", ephemeral=True)
+        run_in_background(interaction, refresh_role_picker(interaction.guild))
     else:
-        await interaction.response.send_message(f"{role.name} is not in the dropdown.", ephemeral=True)
+        await reply(interaction, f"{role.name} is not in the dropdown.", ephemeral=True)
 
 # --- Birthday Command Implementation ---
 
+# Discord rejects embed descriptions longer than this
+EMBED_DESCRIPTION_LIMIT = 4096
+# Upper bound on messages used for one guild's birthday list; entries past it are summarised
+BIRTHDAY_MAX_PAGES = int(os.getenv('DINO_BIRTHDAY_MAX_PAGES', '10'))
+
+# guild_id -> (cache key, [(embed, content hash), ...]) of the last rendered birthday list
+birthday_render_cache = {}
+
+# Drop a guild's cached birthday list, e.g. when a member's display name changes
+def invalidate_birthday_render(guild_id):
+    birthday_render_cache.pop(str(guild_id), None)
+
+def render_birthday_pages(guild: discord.Guild):
+    """
+    Builds the birthday list in upcoming order as a list of (embed, content_hash) pages,
+    each within Discord's description limit and at most BIRTHDAY_MAX_PAGES of them.
+    The result is cached until the guild's birthdays change or the guild's date moves on.
+    """
+    guild_id = str(guild.id)
+    today = datetime.datetime.now(get_guild_timezone(guild.id)).date()
+    cache_key = (store.versions.get(guild_id, 0), today)
+    cached = birthday_render_cache.get(guild_id)
+    if cached and cached[0] == cache_key:
+        return cached[1]
+    started = time.perf_counter()
+
+    guild_birthdays = get_guild_birthdays(guild.id)
+    upcoming = store.upcoming_birthdays(guild.id, today)
+
+    pages = [[]]
+    page_length = 0
+    truncated = 0
+    for position, (_, user_id_str) in enumerate(upcoming):
+        member = cached_member(guild, int(user_id_str))
+        if member:
+            line = f"• **{member.name}**: {guild_birthdays[user_id_str]}"
+        elif MEMBER_CACHE_POLICY == "full":
+            continue # Left the guild; on_raw_member_remove is about to drop them
+        else:
+            # Not cached under a slim policy; Discord shows the mention as the member's name
+            line = f"• <@{user_id_str}>: {guild_birthdays[user_id_str]}"
+        # Leave room on the last page for the "...and N more" note
+        limit = EMBED_DESCRIPTION_LIMIT - (100 if len(pages) == BIRTHDAY_MAX_PAGES else 0)
+        if pages[-1] and page_length + 1 + len(line) > limit:
+            if len(pages) == BIRTHDAY_MAX_PAGES:
+                truncated = len(upcoming) - position
+                break
+            pages.append([])
+            page_length = 0
+        page_length += len(line) + (1 if pages[-1] else 0)
+        pages[-1].append(line)
+
+    if truncated:
+        pages[-1].append(f"…and {truncated} more")
+
+    title = "🎉 Server Birthdays 🎉"
+    rendered = []
+    for number, lines in enumerate(pages, start=1):
+        description = "\n".join(lines) if lines else "No birthdays added yet!"
+        embed = discord.Embed(title=title, description=description, color=discord.Color.blue())
+        footer = f"Page {number}/{len(pages)}" if len(pages) > 1 else ""
+        if footer:
+            embed.set_footer(text=footer)
+        content_hash = hashlib.sha256(f"{title}\n{description}\n{footer}".encode()).hexdigest()
+        rendered.append((embed, content_hash))
+
+    birthday_render_cache[guild_id] = (cache_key, rendered)
+    RENDER_SECONDS.observe(time.perf_counter() - started)
+    return rendered
+
+
+# Best-effort removal of birthday list pages that are no longer used
+async def delete_birthday_pages(channel, message_ids):
+    for message_id in message_ids:
+        try:
+            await channel.get_partial_message(message_id).delete()
+        except discord.HTTPException as e:
+            log.warning("Could not delete old birthday list message %s: %s", message_id, e)
+
+
+# Seconds to wait after a birthday change before refreshing the list, so a burst of
+# submissions produces a single render and edit
+BIRTHDAY_EMBED_DEBOUNCE = float(os.getenv('DINO_EMBED_DEBOUNCE', '5'))
+# guild_id -> task waiting to refresh that guild's birthday list
+pending_embed_updates = {}
+
+# Mark a guild's birthday list dirty; it is refreshed once the debounce window has passed
+def schedule_birthday_embed_update(guild: discord.Guild):
+    if guild.id not in pending_embed_updates:
+        pending_embed_updates[guild.id] = asyncio.create_task(debounced_birthday_embed_update(guild))
+
+async def debounced_birthday_embed_update(guild: discord.Guild):
+    await asyncio.sleep(BIRTHDAY_EMBED_DEBOUNCE)
+    # Changes from now on need another refresh, so let them schedule one
+    pending_embed_updates.pop(guild.id, None)
+    try:
+        await update_birthday_embed(guild)
+    except Exception as e:
+        log.error("Error refreshing birthday embed for guild %s: %s", guild.name, e, extra={"guild_id": guild.id})
+
+
 async def update_birthday_embed(guild: discord.Guild):
     """
-    Fetches all birthdays, constructs the embed, and updates/sends the birthday embed message.
+    Renders the birthday list and updates the pages of the birthday embed, or sends new ones.
+    Only pages whose content changed are edited; extra pages are added or removed as the list
+    grows or shrinks.
     """
-    birthdays_data = load_birthdays()
-    guild_birthdays = birthdays_data.get(str(guild.id), {}).get("users", {})
+    # One update per guild at a time, so overlapping updates cannot send duplicate pages
+    with call_site("birthday_embed"):
+        async with guild_transaction(guild.id, "birthday_embed"):
+            await _update_birthday_embed(guild)
+
+
+async def _update_birthday_embed(guild: discord.Guild):
     embed_info = get_birthday_embed_info(guild.id)
     birthday_channel_id = get_birthday_channel_id(guild.id)
 
     if not birthday_channel_id:
-        print(f"No birthday channel set for guild {guild.name}. Cannot update embed.")
+        log.info("No birthday channel set for guild %s. Cannot update embed.", guild.name, extra={"guild_id": guild.id})
         return # Cannot update if no channel is set
 
     target_channel = guild.get_channel(birthday_channel_id)
     if not target_channel:
-        print(f"Configured birthday channel with ID {birthday_channel_id} not found in guild {guild.name}.")
+        log.warning("Configured birthday channel with ID %s not found in guild %s.", birthday_channel_id, guild.name, extra={"guild_id": guild.id})
         set_birthday_embed_info(guild.id, None, None) # Clear old embed info
         set_birthday_channel_id(guild.id, None) # Clear the channel ID too
         return # Cannot update if channel is gone
 
-    now = datetime.datetime.now()
-    today_month_day = (now.month, now.day)
+    message_ids = get_birthday_embed_message_ids(embed_info)
+    if not message_ids or embed_info.get("channel_id") != birthday_channel_id:
+        # If no embed info, or embed info is for a different channel, send a new one
+        await _send_initial_birthday_embed(guild)
+        return
 
-    # Prepare a list of birthday tuples (month, day, user_id_str, birthday_string)
-    parsed_birthdays = []
-    users_to_remove = [] # To store user IDs that are no longer in the guild
-    for user_id_str, birthday_str in guild_birthdays.items():
-        try:
-            month, day = map(int, birthday_str.split('/'))
-            # Check if user exists in the guild before adding to the list
-            member = guild.get_member(int(user_id_str))
-            if member:
-                parsed_birthdays.append((month, day, user_id_str, birthday_str, member.name))
-            else:
-                users_to_remove.append(user_id_str)
-        except ValueError:
-            print(f"Invalid birthday format for user {user_id_str}: {birthday_str}")
-            users_to_remove.append(user_id_str)
-        except Exception as e:
-            print(f"Error processing birthday for user {user_id_str}: {e}")
-            users_to_remove.append(user_id_str)
-            
-    # Remove users who are no longer in the guild or have invalid birthday formats
-    for user_id_str in users_to_remove:
-        if user_id_str in guild_birthdays:
-            del guild_birthdays[user_id_str]
-            print(f"Removed {user_id_str} from birthdays.json - user not found or invalid format.")
-    save_birthdays(birthdays_data) # Save updated data after removal
-
-    # Sort birthdays based on upcoming order
-    def sort_key(item):
-        month, day, _, _, _ = item
-        bday_date = datetime.datetime(now.year, month, day)
-        # If birthday has passed this year, consider it for next year
-        if bday_date < now:
-            return (bday_date.replace(year=now.year + 1), 1) # 1 to put passed birthdays at the end
-        else:
-            return (bday_date, 0) # 0 to put upcoming birthdays first
+    pages = render_birthday_pages(guild)
+    content_hashes = list(embed_info.get("content_hashes") or [embed_info.get("content_hash")])
+    content_hashes += [None] * (len(message_ids) - len(content_hashes))
+    message_ids = list(message_ids)
 
-    parsed_birthdays.sort(key=sort_key)
+    try:
+        for index, (embed, content_hash) in enumerate(pages):
+            if index >= len(message_ids):
+                # The list grew: add a page at the end
+                message = await target_channel.send(embed=embed)
+                message_ids.append(message.id)
+                content_hashes.append(content_hash)
+                continue
+            if content_hashes[index] == content_hash:
+                continue # Nothing changed on this page since the last edit
+            # Edit through a partial message: the ID is all Discord needs, so no fetch_message
+            await target_channel.get_partial_message(message_ids[index]).edit(embed=embed)
+            content_hashes[index] = content_hash
+            log.info("Updated birthday embed page %d in channel %s", index + 1, target_channel.name, extra={"guild_id": guild.id})
+    except discord.NotFound:
+        log.warning("Birthday embed message not found in channel %s. Sending new one.", target_channel.name, extra={"guild_id": guild.id})
+        # If a page is gone, clear embed info and send the whole list again
+        set_birthday_embed_info(guild.id, None, None)
+        await delete_birthday_pages(target_channel, message_ids)
+        await _send_initial_birthday_embed(guild)
+        return
+    except discord.Forbidden:
+        log.warning("Missing permissions to edit message in channel %s.", target_channel.name, extra={"guild_id": guild.id})
+        # If forbidden, clear embed info and send a new one (permissions might have changed)
+        set_birthday_embed_info(guild.id, None, None)
+        await _send_initial_birthday_embed(guild)
+        return
+    except Exception as e:
+        log.error("Error updating birthday embed: %s. Sending new one.", e, extra={"guild_id": guild.id})
+        set_birthday_embed_info(guild.id, None, None)
+        await delete_birthday_pages(target_channel, message_ids)
+        await _send_initial_birthday_embed(guild)
+        return
 
-    description_lines = []
-    for month, day, user_id_str, birthday_str, username in parsed_birthdays:
-        description_lines.append(f"• **{username}**: {birthday_str}")
+    # The list shrank: remove the pages it no longer needs
+    surplus = message_ids[len(pages):]
+    if surplus:
+        await delete_birthday_pages(target_channel, surplus)
+    set_birthday_embed_info(guild.id, target_channel.id, message_ids[:len(pages)], content_hashes[:len(pages)])
 
-    embed = discord.Embed(
-        title="🎉 Server Birthdays 🎉",
-        description="\n".join(description_lines) if description_lines else "No birthdays added yet!",
-        color=discord.Color.blue()
-    )
 
-    if embed_info and embed_info.get("channel_id") == birthday_channel_id: # Only try to edit if existing embed is in the correct channel
-        try:
-            message = await target_channel.fetch_message(embed_info["message_id"])
-            await message.edit(embed=embed)
-            print(f"Updated birthday embed in channel {target_channel.name}")
-        except discord.NotFound:
-            print(f"Birthday embed message with ID {embed_info['message_id']} not found in channel {target_channel.name}. Sending new one.")
-            # If message is not found, clear embed info and send a new one
-            set_birthday_embed_info(guild.id, None, None)
-            await send_initial_birthday_embed(guild)
-        except discord.Forbidden:
-            print(f"Missing permissions to edit message in channel {target_channel.name}.")
-            # If forbidden, clear embed info and send a new one (permissions might have changed)
-            set_birthday_embed_info(guild.id, None, None)
-            await send_initial_birthday_embed(guild)
-        except Exception as e:
-            print(f"Error updating birthday embed: {e}. Sending new one.")
-            set_birthday_embed_info(guild.id, None, None)
-            await send_initial_birthday_embed(guild)
-    else:
-        # If no embed info, or embed info is for a different channel, send a new one
-        await send_initial_birthday_embed(guild)
+async def send_initial_birthday_embed(guild: discord.Guild):
+    """Sends the birthday embed pages to the configured channel."""
+    # Same lock as update_birthday_embed, so a refresh cannot write the old pages back over these
+    with call_site("birthday_embed"):
+        async with guild_transaction(guild.id, "birthday_embed"):
+            await _send_initial_birthday_embed(guild)
 
 
-async def send_initial_birthday_embed(guild: discord.Guild):
-    """Sends the initial birthday embed to the configured channel."""
+async def _send_initial_birthday_embed(guild: discord.Guild):
     birthday_channel_id = get_birthday_channel_id(guild.id)
     if not birthday_channel_id:
-        print(f"No birthday channel ID set for guild {guild.name}. Cannot send initial embed.")
+        log.info("No birthday channel ID set for guild %s. Cannot send initial embed.", guild.name, extra={"guild_id": guild.id})
         return
 
     target_channel = guild.get_channel(birthday_channel_id)
     if not target_channel:
-        print(f"Configured birthday channel with ID {birthday_channel_id} not found in guild {guild.name}.")
+        log.warning("Configured birthday channel with ID %s not found in guild %s.", birthday_channel_id, guild.name, extra={"guild_id": guild.id})
         # Optionally, reset the channel ID if it's no longer valid
         set_birthday_channel_id(guild.id, None)
         return
 
-    birthdays_data = load_birthdays()
-    guild_birthdays = birthdays_data.get(str(guild.id), {}).get("users", {})
-    description_lines = []
-    
-    now = datetime.datetime.now()
-    today_month_day = (now.month, now.day)
-
-    parsed_birthdays = []
-    users_to_remove = []
-    for user_id_str, birthday_str in guild_birthdays.items():
-        try:
-            month, day = map(int, birthday_str.split('/'))
-            member = guild.get_member(int(user_id_str)) # Use get_member for cached members
-            if member:
-                parsed_birthdays.append((month, day, user_id_str, birthday_str, member.name))
-            else:
-                users_to_remove.append(user_id_str)
-        except ValueError:
-            print(f"Invalid birthday format for user {user_id_str}: {birthday_str}")
-            users_to_remove.append(user_id_str)
-        except Exception as e:
-            print(f"Error processing birthday for user {user_id_str} during initial send: {e}")
-            users_to_remove.append(user_id_str)
-
-    # Remove users who are no longer in the guild or have invalid birthday formats
-    for user_id_str in users_to_remove:
-        if user_id_str in guild_birthdays:
-            del guild_birthdays[user_id_str]
-            print(f"Removed {user_id_str} from birthdays.json during initial embed send - user not found or invalid format.")
-    save_birthdays(birthdays_data) # Save updated data after removal
-
-    def sort_key(item):
-        month, day, _, _, _ = item
-        bday_date = datetime.datetime(now.year, month, day)
-        if bday_date < now:
-            return (bday_date.replace(year=now.year + 1), 1)
-        else:
-            return (bday_date, 0)
-
-    parsed_birthdays.sort(key=sort_key)
-    
-    for month, day, user_id_str, birthday_str, username in parsed_birthdays:
-        description_lines.append(f"• **{username}**: {birthday_str}")
-
-    embed = discord.Embed(
-        title="🎉 Server Birthdays 🎉",
-        description="\n".join(description_lines) if description_lines else "No birthdays added yet!",
-        color=discord.Color.blue()
-    )
-
+    message_ids = []
+    content_hashes = []
     try:
-        message = await target_channel.send(embed=embed)
-        set_birthday_embed_info(guild.id, target_channel.id, message.id)
-        print(f"Sent initial birthday embed to channel {target_channel.name}")
+        for embed, content_hash in render_birthday_pages(guild):
+            message = await target_channel.send(embed=embed)
+            message_ids.append(message.id)
+            content_hashes.append(content_hash)
+        log.info("Sent initial birthday embed to channel %s", target_channel.name, extra={"guild_id": guild.id})
     except discord.Forbidden:
-        print(f"Missing permissions to send messages in channel {target_channel.name}.")
+        log.warning("Missing permissions to send messages in channel %s.", target_channel.name, extra={"guild_id": guild.id})
     except Exception as e:
-        print(f"Error sending initial birthday embed: {e}")
+        log.error("Error sending initial birthday embed: %s", e, extra={"guild_id": guild.id})
+    finally:
+        # Track whatever was sent so the next update edits it instead of starting over
+        if message_ids:
+            set_birthday_embed_info(guild.id, target_channel.id, message_ids, content_hashes)
 
 
 @bot.tree.command(name="birthday", description="Add your birthday to the server's birthday list (MM/DD)")
 @app_commands.describe(date="Your birthday in MM/DD format (e.g., 01/15 for January 15)")
 async def birthday(interaction: discord.Interaction, date: str):
+    # _add_birthday checks and stores without awaiting, so a double submission cannot get past
+    # the "already added" check twice and no transaction is needed
+    await reply(interaction, _add_birthday(interaction, date), ephemeral=True)
+
+# Store the interaction user's birthday if they have none yet; returns the reply for them
+def _add_birthday(interaction: discord.Interaction, date: str):
     user_id = interaction.user.id
     guild_id = interaction.guild.id
 
     # Check if the user has already submitted their birthday
     if get_user_birthday(guild_id, user_id):
-        await interaction.response.send_message("You have already added your birthday. You can only set it once.", ephemeral=True)
-        return
+        return "You have already added your birthday. You can only set it once."
 
-    # Validate date format (MM/DD)
-    try:
-        month, day = map(int, date.split('/'))
-        if not (1 <= month <= 12 and 1 <= day <= 31): # Basic check, doesn't account for days in month
-            raise ValueError
-        # Use a dummy year to validate month/day combo
-        datetime.datetime(2000, month, day)  
-    except ValueError:
-        await interaction.response.send_message("Invalid date format. Please use MM/DD (e.g., 01/15).", ephemeral=True)
-        return
+    # Validate date format (MM/DD), storing it the same way imports do
+    date = normalize_birthday(date)
+    if date is None:
+        return "Invalid date format. Please use MM/DD (e.g., 01/15)."
 
     # Store the birthday
     set_user_birthday(guild_id, user_id, date)
-    await interaction.response.send_message(f"Your birthday ({date}) has been added! The birthday list will be updated.", ephemeral=True)
+    remember_member(interaction.user)
+    birthday_scheduler.ensure_scheduled(guild_id)
+    # Update the birthday embed once this burst of submissions has settled
+    schedule_birthday_embed_update(interaction.guild)
+    return f"Your birthday ({date}) has been added! The birthday list will be updated."
 
-    # Update the birthday embed
-    await update_birthday_embed(interaction.guild)
+# Most birthdays /birthdays_upcoming lists, so the answer fits in one embed
+UPCOMING_MAX_COUNT = 50
+UPCOMING_DEFAULT_COUNT = 10
+
+@bot.tree.command(name="birthdays_upcoming", description="Show the next birthdays on this server.")
+@app_commands.describe(
+    days="Only show birthdays within this many days (0 for today).",
+    count=f"Show at most this many birthdays (default {UPCOMING_DEFAULT_COUNT})."
+)
+async def birthdays_upcoming(interaction: discord.Interaction, days: app_commands.Range[int, 0, 366] = None,
+                             count: app_commands.Range[int, 1, UPCOMING_MAX_COUNT] = None):
+    guild = interaction.guild
+    today = datetime.datetime.now(get_guild_timezone(guild.id)).date()
+    if count is None:
+        count = UPCOMING_MAX_COUNT if days is not None else UPCOMING_DEFAULT_COUNT
+    guild_birthdays = get_guild_birthdays(guild.id)
+
+    lines = []
+    for when, user_id_str in store.next_birthdays(guild.id, today, count=count, days=days):
+        member = cached_member(guild, int(user_id_str))
+        if member:
+            name = f"**{member.name}**"
+        elif MEMBER_CACHE_POLICY == "full":
+            continue # Left the guild; on_raw_member_remove is about to drop them
+        else:
+            name = f"<@{user_id_str}>"
+        until = (when - today).days
+        relative = "today 🎉" if until == 0 else "tomorrow" if until == 1 else f"in {until} days"
+        lines.append(f"• {name}: {guild_birthdays[user_id_str]} ({relative})")
+
+    if not lines:
+        within = f" in the next {days} days" if days else " today" if days == 0 else ""
+        await reply(interaction, f"No upcoming birthdays{within}.", ephemeral=True)
+        return
+    embed = discord.Embed(title="🎂 Upcoming Birthdays", description="\n".join(lines), color=discord.Color.blue())
+    await reply(interaction, embed=embed, ephemeral=True)
 
 @bot.tree.command(name="send_birthday_embed", description="Sends the server's birthday list embed to a specified channel.")
-@has_permissions(administrator=True) # Only administrators can use this command
+@app_commands.checks.has_permissions(administrator=True) # Only administrators can use this command
 @app_commands.describe(channel="The channel where the birthday embed should be sent.")
 async def send_birthday_embed(interaction: discord.Interaction, channel: discord.TextChannel):
+    # Sending every page can take longer than Discord waits for an answer
+    await defer(interaction)
     guild_id = interaction.guild.id
 
     # Set the birthday channel if it's different or not already set
-    if get_birthday_channel_id(guild_id) != channel.id:
+    channel_changed = get_birthday_channel_id(guild_id) != channel.id
+    if channel_changed:
         set_birthday_channel_id(guild_id, channel.id)
-        await interaction.response.send_message(f"Birthday channel set to {channel.mention}. Sending birthday embed...", ephemeral=True)
-    else:
-        await interaction.response.send_message(f"Sending birthday embed to {channel.mention}...", ephemeral=True)
-
-    await interaction.response.defer(ephemeral=True, thinking=True) # Defer the response
+        birthday_scheduler.ensure_scheduled(guild_id)
 
     # Call the function to send/update the embed
     await send_initial_birthday_embed(interaction.guild)
-    
-    await interaction.followup.send(f"Birthday embed sent to {channel.mention} successfully!", ephemeral=True)
+
+    prefix = f"Birthday channel set to {channel.mention}. " if channel_changed else ""
+    await interaction.followup.send(f"{prefix}Birthday embed sent to {channel.mention} successfully!", ephemeral=True)
     
 @bot.tree.command(name="set_birthday_channel", description="Set the channel where birthday messages will be sent.")
-@has_permissions(manage_channels=True) # Requires manage channels permission to set this
+@app_commands.checks.has_permissions(manage_channels=True) # Requires manage channels permission to set this
 @app_commands.describe(channel="The text channel for birthday messages.")
 async def set_birthday_channel(interaction: discord.Interaction, channel: discord.TextChannel):
     guild_id = interaction.guild.id
     set_birthday_channel_id(guild_id, channel.id)
-    await interaction.response.send_message(f"Birthday messages will now be sent to and updated in {channel.mention}.", ephemeral=True)
-    
+    birthday_scheduler.ensure_scheduled(guild_id)
+    await reply(interaction, f"Birthday messages will now be sent to and updated in {channel.mention}.", ephemeral=True)
+
     # Immediately try to send/update the embed in the *new* channel.
-    await update_birthday_embed(interaction.guild)
+    run_in_background(interaction, update_birthday_embed(interaction.guild))
+
+@bot.tree.command(name="set_birthday_timezone", description="Set the timezone used to decide when a birthday starts.")
+@app_commands.checks.has_permissions(manage_channels=True) # Same permission as choosing the birthday channel
+@app_commands.describe(timezone="An IANA timezone name, e.g. Europe/Berlin or America/New_York.")
+async def set_birthday_timezone(interaction: discord.Interaction, timezone: str):
+    try:
+        zoneinfo.ZoneInfo(timezone)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        await reply(interaction, f"Unknown timezone `{timezone}`. Use a name like `Europe/Berlin`.", ephemeral=True)
+        return
+
+    set_guild_timezone(interaction.guild.id, timezone)
+    # Move the next check to midnight in the new timezone
+    birthday_scheduler.schedule(interaction.guild.id)
+    await reply(interaction, f"Birthday greetings will now go out at midnight {timezone} time.", ephemeral=True)
+
+@bot.tree.command(name="set_birthday_greeting", description="Set how birthday greetings are worded and whether they are combined.")
+@app_commands.checks.has_permissions(manage_channels=True) # Same permission as choosing the birthday channel
+@app_commands.describe(
+    template="Message text with {mentions} and optionally {greeting}; 'default' restores the built-in text.",
+    combined="Greet everyone with a birthday on the same day in one message (default) or one message each."
+)
+async def set_birthday_greeting(interaction: discord.Interaction, template: str = None, combined: bool = None):
+    guild_id = interaction.guild.id
+    if template is not None:
+        if template.lower() == "default":
+            template = None
+        else:
+            problem = greeting_template_problem(template)
+            if problem:
+                await reply(interaction, problem, ephemeral=True)
+                return
+        set_greeting_template(guild_id, template)
+    if combined is not None:
+        set_greeting_mode(guild_id, "batched" if combined else "each")
+
+    current = get_greeting_template(guild_id) or DEFAULT_GREETING_TEMPLATE
+    mode = "one message for everyone" if greets_in_batches(guild_id) else "one message per member"
+    preview = current.format(greeting="Happy Birthday", mentions=interaction.user.mention)
+    await reply(interaction, f"Birthday greetings are sent as {mode}. Preview:\n{preview}", ephemeral=True)
+
+# --- Bulk Import and Export ---
+# Admins can bring a whole community's birthdays over in one command instead of one /birthday
+# per member, and download what is stored for their server. Imports are CSV (user_id,MM/DD per
+# line, header optional) or JSON: either an /export_birthdays file, a {"user_id": "MM/DD"}
+# object or a list of {"user_id": ..., "birthday": ...} entries. The file is parsed and
+# validated off the event loop; nothing is stored unless every row is valid, and the whole
+# batch is applied without yielding, so it reaches the backend as a single write.
+IMPORT_MAX_BYTES = int(os.getenv('DINO_IMPORT_MAX_BYTES', str(2 * 1024 * 1024)))
+# Problems listed in the reply to a rejected import; the rest are only counted
+IMPORT_PROBLEM_LIMIT = 10
+# Exports larger than this are spooled to a temporary file instead of memory
+EXPORT_SPOOL_BYTES = 1024 * 1024
+
+# (where, user_id, birthday) for each data row of a CSV import
+def csv_import_rows(stream):
+    for line_number, row in enumerate(csv.reader(stream), start=1):
+        if not row or not "".join(row).strip():
+            continue
+        if line_number == 1 and not row[0].strip().isdecimal():
+            continue # Header
+        yield f"line {line_number}", row[0].strip(), row[1].strip() if len(row) > 1 else ""
+
+# (where, user_id, birthday) for each entry of a JSON import, plus the dropdown roles it
+# carries (only /export_birthdays files do) or None
+def json_import_rows(document):
+    roles = None
+    if isinstance(document, dict) and isinstance(document.get("birthdays"), dict):
+        roles = document.get("roles")
+        document = document["birthdays"].get("users", {})
+    if isinstance(document, dict):
+        rows = ((f"user {user_id}", user_id, birthday) for user_id, birthday in document.items())
+    elif isinstance(document, list):
+        rows = ((f"entry {index}", entry.get("user_id"), entry.get("birthday")) if isinstance(entry, dict)
+                else (f"entry {index}", None, None) for index, entry in enumerate(document, start=1))
+    else:
+        rows = [("file", None, None)]
+    return rows, roles
+
+# Parse and validate an import file. Returns ({user_id: "MM/DD"}, [role_id, ...] or None,
+# the first IMPORT_PROBLEM_LIMIT problems, total number of problems). Runs in a worker thread.
+def read_birthday_import(data, filename):
+    problems = []
+    problem_count = 0
+    roles = None
+    if filename.lower().endswith(".json"):
+        try:
+            rows, roles = json_import_rows(json.loads(data))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            return {}, None, [f"The file is not valid JSON: {e}"], 1
+    else:
+        rows = csv_import_rows(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline=""))
+
+    birthdays = {}
+    try:
+        for where, user_id, date in rows:
+            snowflake = parse_snowflake(user_id)
+            birthday = normalize_birthday(date)
+            if snowflake is None:
+                problem = f"{where}: `{str(user_id).strip()[:40]}` is not a user ID"
+            elif birthday is None:
+                problem = f"{where}: `{str(date)[:40]}` is not a valid MM/DD date"
+            elif str(snowflake) in birthdays:
+                problem = f"{where}: user {snowflake} is listed more than once"
+            else:
+                birthdays[str(snowflake)] = birthday
+                continue
+            problem_count += 1
+            if len(problems) < IMPORT_PROBLEM_LIMIT:
+                problems.append(problem)
+    except UnicodeDecodeError:
+        return {}, None, ["The file is not UTF-8 text."], 1
+
+    role_ids = None
+    if roles is not None:
+        role_ids = []
+        for entry in roles if isinstance(roles, list) else [roles]:
+            try:
+                role_ids.append(int(entry["id"]))
+            except (TypeError, KeyError, ValueError):
+                problem_count += 1
+                if len(problems) < IMPORT_PROBLEM_LIMIT:
+                    problems.append(f"roles: `{str(entry)[:40]}` is not a role")
+    return birthdays, role_ids, problems, problem_count
+
+# Write a guild's export to a file object, JSON chunk by chunk or CSV row by row. Runs in a worker thread.
+def write_export(snapshot, kind):
+    file = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    if kind == "csv":
+        writer = csv.writer(text)
+        writer.writerow(["user_id", "birthday"])
+        writer.writerows(snapshot["birthdays"].get("users", {}).items())
+    else:
+        for chunk in json.JSONEncoder(indent=4).iterencode(snapshot):
+            text.write(chunk)
+    text.flush()
+    text.detach()
+    file.seek(0)
+    return file
+
+@bot.tree.command(name="import_birthdays", description="Add many birthdays at once from a CSV or JSON file (Admin only).")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(
+    file="CSV with user_id,MM/DD lines, or JSON such as a file from /export_birthdays.",
+    replace_existing="Overwrite birthdays members have already set (default: keep them).",
+    restore_roles="Replace the role dropdown with the roles in an /export_birthdays file (default: leave it)."
+)
+async def import_birthdays(interaction: discord.Interaction, file: discord.Attachment, replace_existing: bool = False,
+                           restore_roles: bool = False):
+    if file.size > IMPORT_MAX_BYTES:
+        await reply(interaction, f"The file is too large. Imports can be at most {IMPORT_MAX_BYTES // 1024} KiB.", ephemeral=True)
+        return
+    await defer(interaction)
+
+    data = await file.read()
+    birthdays, role_ids, problems, problem_count = await asyncio.to_thread(read_birthday_import, data, file.filename)
+    if problem_count:
+        more = f"\n…and {problem_count - len(problems)} more." if problem_count > len(problems) else ""
+        await interaction.followup.send(
+            f"Nothing was imported: {problem_count} problem(s) in `{file.filename}`.\n" + "\n".join(problems) + more, ephemeral=True)
+        return
+
+    guild = interaction.guild
+    existing = get_guild_birthdays(guild.id)
+    kept = 0
+    if not replace_existing:
+        listed = len(birthdays)
+        birthdays = {user_id: birthday for user_id, birthday in birthdays.items() if user_id not in existing}
+        kept = listed - len(birthdays)
+    imported = len(birthdays)
+    # Applied in one call without awaiting, so the batch is stored as one write
+    set_user_birthdays(guild.id, birthdays)
+    # Only touch the dropdown when asked to, and never empty it because the file came from
+    # another server whose roles do not exist here
+    roles = [role for role in (guild.get_role(role_id) for role_id in role_ids or []) if role]
+    roles_restored = restore_roles and bool(roles)
+    if roles_restored:
+        update_roles_for_guild(guild.id, [{"id": role.id, "name": role.name, "color": str(role.color)} for role in roles])
+        invalidate_role_options(guild.id)
+    try:
+        await store.sync()
+    except Exception:
+        saved = False
+    else:
+        saved = True
+    log.info("Imported %d birthdays from %s.", imported, file.filename, extra={"guild_id": guild.id})
+
+    birthday_scheduler.ensure_scheduled(guild.id)
+    run_in_background(interaction, update_birthday_embed(guild))
+    if roles_restored:
+        run_in_background(interaction, refresh_role_picker(guild))
+
+    message = f"Imported {imported} birthdays."
+    if not saved:
+        message += " They could not be saved to disk yet; the bot keeps retrying, but they may be lost if it restarts first."
+    if kept:
+        message += f" Kept {kept} birthdays members had already set."
+    if roles_restored:
+        message += f" The role dropdown now has {len(roles)} roles."
+        if len(roles) < len(role_ids):
+            message += f" {len(role_ids) - len(roles)} roles from the file do not exist on this server and were left out."
+    elif restore_roles and role_ids:
+        message += " None of the file's roles exist on this server, so the role dropdown was left as it is."
+    elif role_ids and not restore_roles:
+        message += " The file also lists dropdown roles; import it again with `restore_roles` to use them."
+    await interaction.followup.send(message, ephemeral=True)
+
+@bot.tree.command(name="export_birthdays", description="Download this server's birthdays and role settings (Admin only).")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(format="JSON has everything and can be imported again; CSV has only the birthdays.")
+@app_commands.choices(format=[
+    app_commands.Choice(name="JSON", value="json"),
+    app_commands.Choice(name="CSV", value="csv"),
+])
+async def export_birthdays(interaction: discord.Interaction, format: app_commands.Choice[str] = None):
+    kind = format.value if format else "json"
+    await defer(interaction)
+
+    guild_id = str(interaction.guild.id)
+    # Copy what the export needs, so later changes cannot reach the worker thread mid-write
+    birthdays = dict(store.get("birthdays", (guild_id,), {}))
+    birthdays["users"] = dict(birthdays.get("users", {}))
+    snapshot = {
+        "guild_id": guild_id,
+        "roles": get_roles_for_guild(guild_id),
+        "user_roles": dict(store.get("user_roles", (guild_id,), {})),
+        "birthdays": birthdays,
+    }
+    export = await asyncio.to_thread(write_export, snapshot, kind)
+    await interaction.followup.send(
+        f"{len(birthdays['users'])} birthdays from this server.",
+        file=discord.File(export, filename=f"birthdays-{guild_id}.{kind}"), ephemeral=True)
 
 @bot.tree.command(name="birthday_help", description="Get help on how to use the birthday system.")
 async def birthday_help(interaction: discord.Interaction):
@@ -510,73 +2294,317 @@ async def birthday_help(interaction: discord.Interaction):
         inline=False
     )
 
-    await interaction.response.send_message(embed=embed)
-
+    embed.add_field(
+        name="3. See Who's Next",
+        value=(
+            "Use `/birthdays_upcoming` to see the next birthdays on this server.\n"
+            "Example: `/birthdays_upcoming days:7` (everyone in the coming week)"
+        ),
+        inline=False
+    )
 
-@tasks.loop(hours=24) # Check every 24 hours
-async def birthday_check():
+    await reply(interaction, embed=embed)
+
+
+# --- Birthday Greetings ---
+# Greetings are built from a per-guild template with {greeting} ("Happy Birthday" or "Happy
+# belated Birthday") and {mentions} placeholders. In batched mode (the default, see
+# DINO_GREETING_MODE) one message mentions every celebrant of the day, split only where
+# Discord's message limit requires it; in "each" mode every celebrant gets their own message.
+GREETING_MODE = os.getenv('DINO_GREETING_MODE', 'batched')
+DEFAULT_GREETING_TEMPLATE = "🎉 {greeting}, {mentions}! 🎉 We wish you a wonderful day filled with joy and celebration!"
+MESSAGE_LIMIT = 2000
+# Discord accepts at most this many users in allowed_mentions
+MENTION_LIMIT = 100
+GREETING_PLACEHOLDERS = {"greeting", "mentions"}
+# Room a template must leave for at least a few mentions
+MAX_GREETING_TEMPLATE_LENGTH = 1800
+
+# Why a greeting template is unusable, or None if it is fine
+def greeting_template_problem(template):
+    if len(template) > MAX_GREETING_TEMPLATE_LENGTH:
+        return f"The template can be at most {MAX_GREETING_TEMPLATE_LENGTH} characters long."
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(template) if field is not None]
+    except ValueError:
+        return "The template has an unmatched `{` or `}`. Use `{{` and `}}` for literal braces."
+    if "mentions" not in fields:
+        return "The template must contain `{mentions}`."
+    if fields.count("mentions") > 1:
+        return "The template can only contain `{mentions}` once."
+    unknown = set(fields) - GREETING_PLACEHOLDERS
+    if unknown:
+        return f"Unknown placeholder `{{{sorted(unknown)[0]}}}`. Use `{{greeting}}` and `{{mentions}}`."
+    # Format specs and conversions are only checked when used: {mentions:x} and {mentions!z}
+    # raise, and {mentions:>5000} could still blow the limit
+    try:
+        formatted = template.format(greeting="Happy belated Birthday", mentions="")
+    except (ValueError, KeyError):
+        return "The template has an invalid format spec or conversion. Use plain `{greeting}` and `{mentions}`."
+    if len(formatted) > MAX_GREETING_TEMPLATE_LENGTH:
+        return f"The greeting can be at most {MAX_GREETING_TEMPLATE_LENGTH} characters long before mentions."
+    return None
+
+# (text, members) for each greeting message to the given members, every text within
+# MESSAGE_LIMIT and mentioning at most MENTION_LIMIT members
+def render_greetings(template, greeting, members):
+    overhead = len(template.format(greeting=greeting, mentions=""))
+    # Templates saved before repeats were rejected may still list the mentions more than once
+    repeats = max(1, sum(1 for _, field, _, _ in string.Formatter().parse(template) if field == "mentions"))
+    messages = []
+    batch = []
+    length = overhead
+    for member in members:
+        added = (len(member.mention) + (2 if batch else 0)) * repeats
+        if batch and (length + added > MESSAGE_LIMIT or len(batch) == MENTION_LIMIT):
+            messages.append((template.format(greeting=greeting, mentions=", ".join(m.mention for m in batch)), batch))
+            batch = []
+            length = overhead
+            added = len(member.mention) * repeats
+        batch.append(member)
+        length += added
+    if batch:
+        messages.append((template.format(greeting=greeting, mentions=", ".join(m.mention for m in batch)), batch))
+    return messages
+
+
+async def birthday_check(guild: discord.Guild, day: datetime.date, belated: bool = False):
     """
-    Checks for birthdays daily and sends a greeting message to the configured channel,
-    pinging the user. It also updates the birthday embed for each guild.
+    Greets everyone in the guild whose birthday is on the given (guild-local) day in the
+    configured channel, pinging only them: in one message per MESSAGE_LIMIT characters when
+    the guild greets in batches, otherwise one message each.
     """
-    now = datetime.datetime.now()
-    today_mm_dd = now.strftime("%m/%d")
+    birthday_channel_id = get_birthday_channel_id(guild.id)
 
-    birthdays_data = load_birthdays()
+    birthday_channel = None
+    if birthday_channel_id:
+        birthday_channel = guild.get_channel(birthday_channel_id)
+        if not birthday_channel:
+            log.warning("Birthday channel with ID %s not found in guild %s. Clearing ID.", birthday_channel_id, guild.name, extra={"guild_id": guild.id})
+            set_birthday_channel_id(guild.id, None) # Clear the invalid channel ID
 
-    # Iterate over a copy of guild_data to allow modification during iteration
-    for guild_id_str, guild_data in list(birthdays_data.items()): 
-        guild_id = int(guild_id_str)
-        guild = bot.get_guild(guild_id)
-        
-        if not guild:
-            print(f"Guild with ID {guild_id} not found. Skipping birthday check for this guild.")
-            # Optionally remove the guild from birthdays_data if it no longer exists
-            if guild_id_str in birthdays_data:
-                del birthdays_data[guild_id_str]
-                save_birthdays(birthdays_data)
+    greeting = "Happy belated Birthday" if belated else "Happy Birthday"
+
+    # Only look at the users whose birthday is on this day, straight from the calendar index
+    user_ids = [int(user_id_str) for user_id_str in store.birthdays_on(day, guild.id)]
+    if not user_ids:
+        return
+    if not birthday_channel: # Only send greetings if a valid channel exists
+        log.info("No valid birthday channel for greetings in guild %s.", guild.name, extra={"guild_id": guild.id})
+        return
+
+    members, departed = await resolve_members(guild, user_ids)
+    for user_id in departed:
+        log.info("User %s not found in guild %s. Removing their birthday from records.", user_id, guild.name, extra={"guild_id": guild.id})
+        remove_user_birthday(guild.id, user_id)
+
+    celebrants = [members[user_id] for user_id in user_ids if user_id in members]
+    template = get_greeting_template(guild.id) or DEFAULT_GREETING_TEMPLATE
+    if greets_in_batches(guild.id):
+        batches = [celebrants]
+    else:
+        batches = [[member] for member in celebrants]
+
+    for batch in batches:
+        for content, mentioned in render_greetings(template, greeting, batch):
+            try:
+                # Ping the celebrants and nobody else, whatever the template says
+                await birthday_channel.send(content, allowed_mentions=discord.AllowedMentions(everyone=False, roles=False, users=mentioned))
+            except discord.Forbidden:
+                log.warning("Missing permissions to send message in channel %s in guild %s.", birthday_channel.name, guild.name, extra={"guild_id": guild.id})
+                return # Every other greeting would fail the same way
+            except Exception as e:
+                log.error("Error sending birthday message: %s", e, extra={"guild_id": guild.id})
+    if celebrants:
+        log.info("Sent birthday wishes to %d members in %s.", len(celebrants), guild.name, extra={"guild_id": guild.id})
+
+
+# --- Member Lookups ---
+# Recently looked-up members that are not in the guild's own cache, (guild_id, user_id) -> member
+member_lookup_cache = collections.OrderedDict()
+
+# Keep a member in the lookup LRU, evicting the least recently used beyond MEMBER_LRU_SIZE
+def remember_member(member: discord.Member):
+    if MEMBER_CACHE_POLICY == "full" or member.guild.get_member(member.id) is not None:
+        return
+    key = (member.guild.id, member.id)
+    member_lookup_cache[key] = member
+    member_lookup_cache.move_to_end(key)
+    while len(member_lookup_cache) > MEMBER_LRU_SIZE:
+        member_lookup_cache.popitem(last=False)
+
+# A member from the guild's cache or the lookup LRU, or None without asking Discord
+def cached_member(guild: discord.Guild, user_id):
+    member = guild.get_member(user_id)
+    if member is None:
+        member = member_lookup_cache.get((guild.id, user_id))
+        if member is not None:
+            member_lookup_cache.move_to_end((guild.id, user_id))
+    return member
+
+# Find members for the given user IDs: the member cache first, then one gateway request per
+# 100 misses. Returns ({user_id: member}, [user IDs confirmed to have left the guild]).
+async def resolve_members(guild: discord.Guild, user_ids):
+    members = {}
+    missing = []
+    for user_id in user_ids:
+        member = cached_member(guild, user_id)
+        if member:
+            members[user_id] = member
+        else:
+            missing.append(user_id)
+
+    departed = []
+    for start in range(0, len(missing), 100):
+        batch = missing[start:start + 100]
+        try:
+            # Under the lazy policy lookups go to the LRU instead of growing the guild's cache
+            found = await guild.query_members(user_ids=batch, limit=len(batch), cache=MEMBER_CACHE_POLICY != "lazy")
+        except asyncio.TimeoutError:
+            log.warning("Timed out looking up %d members in guild %s.", len(batch), guild.name, extra={"guild_id": guild.id})
             continue
+        for member in found:
+            members[member.id] = member
+            remember_member(member)
+        departed.extend(user_id for user_id in batch if user_id not in members)
+    return members, departed
+
+
+# The UTC timestamp of the next midnight in the given timezone
+def next_local_midnight(tz, now=None):
+    now = now or time.time()
+    local_today = datetime.datetime.fromtimestamp(now, tz).date()
+    midnight = datetime.datetime.combine(local_today + datetime.timedelta(days=1), datetime.time(), tzinfo=tz)
+    return midnight.timestamp()
+
 
-        birthday_channel_id = get_birthday_channel_id(guild_id)
-        
-        birthday_channel = None
-        if birthday_channel_id:
-            birthday_channel = guild.get_channel(birthday_channel_id)
-            if not birthday_channel:
-                print(f"Birthday channel with ID {birthday_channel_id} not found in guild {guild.name}. Clearing ID.")
-                set_birthday_channel_id(guild.id, None) # Clear the invalid channel ID
-        
-        users_with_birthdays = guild_data.get("users", {})
-        # Create a list of user IDs to iterate over, allowing safe deletion from the dictionary
-        users_to_check = list(users_with_birthdays.keys())
-
-        for user_id_str in users_to_check:
-            birthday_date = users_with_birthdays.get(user_id_str)
-            if birthday_date == today_mm_dd:
-                user_id = int(user_id_str)
-                if birthday_channel: # Only send greeting if a valid channel exists
+# How many guilds the daily check processes at once. discord.py queues requests that would
+# exceed a rate limit, so this only bounds how much work is in flight at the same time.
+DAILY_CHECK_CONCURRENCY = int(os.getenv('DINO_DAILY_CHECK_CONCURRENCY', '8'))
+
+
+class BirthdayScheduler:
+    """Runs the daily birthday check for every guild right after its local midnight.
+
+    Due times sit in a heap of (timestamp, guild_id); rescheduling a guild pushes a new entry
+    and leaves the old one to be skipped when it surfaces. The task sleeps until the earliest
+    entry is due or a guild is (re)scheduled, so nothing polls while no guild is due. The last
+    processed date is stored per guild, so after a restart missed days are caught up (at most
+    MAX_CATCH_UP_DAYS) and days already handled are never greeted twice.
+    """
+
+    def __init__(self, concurrency=DAILY_CHECK_CONCURRENCY):
+        self.heap = []
+        self.due = {}  # guild_id -> timestamp of its live heap entry
+        self.running = {}  # guild_id -> task currently checking that guild
+        self.wakeup = asyncio.Event()
+        self.limit = asyncio.Semaphore(concurrency)
+        self.task = None
+        self.prefetch_task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    # (Re)schedule a guild for its next local midnight, or for `when` if given
+    def schedule(self, guild_id, when=None):
+        guild_id = str(guild_id)
+        if when is None:
+            when = next_local_midnight(get_guild_timezone(guild_id))
+        self.due[guild_id] = when
+        heapq.heappush(self.heap, (when, guild_id))
+        self.wakeup.set()
+
+    # Schedule a guild unless it already has an entry
+    def ensure_scheduled(self, guild_id):
+        if str(guild_id) not in self.due:
+            self.schedule(guild_id)
+
+    async def run(self):
+        await bot.wait_until_ready()
+        # Catch up on members and guilds that left while the bot was offline
+        reconcile_stores()
+        if MEMBER_CACHE_POLICY == "tracked":
+            self.prefetch_task = asyncio.create_task(prefetch_tracked_members())
+        log.info("Birthday scheduler is ready.")
+        # Check every known guild straight away; this catches up on anything missed while offline
+        for guild_id in list(store.data["birthdays"]):
+            self.schedule(guild_id, when=time.time())
+
+        while True:
+            # Drop entries that were superseded by a later schedule() call
+            while self.heap and self.due.get(self.heap[0][1]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, guild_id = heapq.heappop(self.heap)
+            del self.due[guild_id]
+            if guild_id not in self.running:
+                # A running check reschedules its guild itself when it finishes
+                self.running[guild_id] = asyncio.create_task(self.run_guild_limited(guild_id))
+
+    async def run_guild_limited(self, guild_id):
+        try:
+            async with self.limit:
+                await self.run_guild(guild_id)
+        except Exception as e:
+            log.exception("Error running birthday check for guild %s: %s", guild_id, e, extra={"guild_id": guild_id})
+            self.ensure_scheduled(guild_id)
+        finally:
+            del self.running[guild_id]
+
+    async def run_guild(self, guild_id):
+        guild = bot.get_guild(int(guild_id))
+        if not guild:
+            # Left guilds are cleaned up by on_guild_remove; just stop scheduling this one
+            log.info("Guild with ID %s not found. Skipping birthday check for this guild.", guild_id, extra={"guild_id": guild_id})
+            return
+
+        today = datetime.datetime.now(get_guild_timezone(guild_id)).date()
+        last_checked = get_last_birthday_check(guild_id)
+        if last_checked is None:
+            first_day = today
+        else:
+            first_day = max(last_checked + datetime.timedelta(days=1), today - datetime.timedelta(days=MAX_CATCH_UP_DAYS - 1))
+
+        if first_day <= today:
+            started = time.perf_counter()
+            with call_site("daily_check"):
+                day = first_day
+                while day <= today:
+                    await birthday_check(guild, day, belated=day < today)
+                    set_last_birthday_check(guild.id, day)
+                    # Make sure a restart cannot greet the same day twice
                     try:
-                        member = await guild.fetch_member(user_id)
-                        await birthday_channel.send(f"🎉 Happy Birthday, {member.mention}! 🎉 We wish you a wonderful day filled with joy and celebration!")
-                        print(f"Sent birthday wish to {member.name} in {guild.name}.")
-                    except discord.NotFound:
-                        print(f"User {user_id} not found in guild {guild.name}. Removing their birthday from records.")
-                        if user_id_str in users_with_birthdays:
-                            del users_with_birthdays[user_id_str]
-                            birthdays_data[guild_id_str]["users"] = users_with_birthdays
-                            save_birthdays(birthdays_data)  
-                    except discord.Forbidden:
-                        print(f"Missing permissions to send message in channel {birthday_channel.name} in guild {guild.name}.")
-                    except Exception as e:
-                        print(f"Error sending birthday message for user {user_id}: {e}")
-                else:
-                    print(f"No valid birthday channel for greetings in guild {guild.name}.")
-        
-        # After processing all birthdays (and potentially removing users), update the embed for this guild
-        await update_birthday_embed(guild)
+                        await store.sync()
+                    except Exception:
+                        # Greeting more days now could repeat them all after a restart
+                        log.error("Could not save the birthday check for %s; trying again in %d s.", day, DAILY_CHECK_RETRY_SECONDS, extra={"guild_id": guild.id})
+                        self.schedule(guild_id, when=time.time() + DAILY_CHECK_RETRY_SECONDS)
+                        return
+                    day += datetime.timedelta(days=1)
+                # Re-order the birthday list now that the date has moved on
+                await update_birthday_embed(guild)
+            duration = time.perf_counter() - started
+            DAILY_CHECK_SECONDS.observe(duration)
+            DAILY_CHECK_LAST_SECONDS.set(duration, guild_id=guild_id)
+        self.schedule(guild_id)
+
+
+birthday_scheduler = BirthdayScheduler()
 
 @bot.tree.command(name="update_embed_command", description="Update an existing embed by message ID (Admin only).")
-@has_permissions(administrator=True) # Only administrators can use this command
+@app_commands.checks.has_permissions(administrator=True) # Only administrators can use this command
 @app_commands.describe(
     channel="The channel where the embed message is located.",
     message_id="The ID of the message to update.",
@@ -593,10 +2621,10 @@ async def update_embed_command(
     try:
         message_id_int = int(message_id)
     except ValueError:
-        await interaction.response.send_message("Invalid Message ID. Please provide a valid numerical ID.", ephemeral=True)
+        await reply(interaction, "Invalid Message ID. Please provide a valid numerical ID.", ephemeral=True)
         return
 
-    await interaction.response.defer(ephemeral=True) # Defer the response
+    await defer(interaction)
 
     try:
         message = await channel.fetch_message(message_id_int)
@@ -637,12 +2665,176 @@ async def update_embed_command(
     except Exception as e:
         await interaction.followup.send(f"An error occurred while updating the embed: {e}", ephemeral=True)
 
-# Ensure the birthday_check loop starts only when the bot is ready
-@birthday_check.before_loop
-async def before_birthday_check():
-    await bot.wait_until_ready()
-    print("Birthday check loop is ready.")
+# --- Bulk Embed Editing ---
+# /update_embeds changes the title or description of many of the bot's embeds in one go. The
+# messages are found with a single history scan instead of one fetch per ID, then edited a few
+# at a time: edits in a channel share one rate-limit bucket that discord.py waits out on 429s,
+# so more in flight would only queue behind it. One follow-up message shows the progress.
+BULK_EDIT_CONCURRENCY = int(os.getenv('DINO_BULK_EDIT_CONCURRENCY', '4'))
+# Most messages one /update_embeds run scans
+BULK_EDIT_SCAN_LIMIT = 1000
+# Seconds between progress updates
+BULK_EDIT_PROGRESS_INTERVAL = 2
+
+# Parse "111 222, 333-444" into [(low, high), ...] ID intervals; raises ValueError if malformed
+def parse_message_id_spec(spec):
+    intervals = []
+    for part in spec.replace(",", " ").split():
+        low, dash, high = part.partition("-")
+        low = parse_snowflake(low)
+        high = parse_snowflake(high) if dash else low
+        if low is None or high is None:
+            raise ValueError(f"{part!r} is not a message ID or range")
+        intervals.append((min(low, high), max(low, high)))
+    if not intervals:
+        raise ValueError("no message IDs")
+    return intervals
+
+# The bot's messages with embeds in a channel, oldest first: either among the last `last`
+# messages or with IDs in the given intervals. Returns (messages, whether the scan hit
+# BULK_EDIT_SCAN_LIMIT before covering everything asked for).
+async def find_bot_embeds(channel, last=None, intervals=None):
+    if last is not None:
+        limit = min(last, BULK_EDIT_SCAN_LIMIT)
+        history = channel.history(limit=limit)
+    else:
+        # One scan over the span of all requested IDs, oldest first
+        limit = BULK_EDIT_SCAN_LIMIT
+        history = channel.history(
+            limit=limit + 1,
+            after=discord.Object(id=min(low for low, _ in intervals) - 1),
+            before=discord.Object(id=max(high for _, high in intervals) + 1),
+            oldest_first=True)
+    found = []
+    scanned = 0
+    async for message in history:
+        scanned += 1
+        if scanned > limit:
+            return sorted(found, key=lambda message: message.id), True
+        if message.author.id != channel.guild.me.id or not message.embeds:
+            continue
+        if intervals and not any(low <= message.id <= high for low, high in intervals):
+            continue
+        found.append(message)
+    return sorted(found, key=lambda message: message.id), False
+
+# Edit the first embed of each message, at most BULK_EDIT_CONCURRENCY at a time. Returns a
+# future for all the edits; counts ({"edited": n, "failed": n}) is kept current as they finish.
+def start_embed_edits(messages, title, description, counts):
+    limit = asyncio.Semaphore(BULK_EDIT_CONCURRENCY)
+
+    async def edit(message):
+        embed = discord.Embed.from_dict(message.embeds[0].to_dict())
+        if title is not None:
+            embed.title = title
+        if description is not None:
+            embed.description = description
+        async with limit:
+            try:
+                # Keep any further embeds the message has
+                await message.edit(embeds=[embed] + message.embeds[1:])
+                counts["edited"] += 1
+            except discord.HTTPException as e:
+                counts["failed"] += 1
+                log.warning("Could not edit embed in message %s: %s", message.id, e, extra={"guild_id": message.channel.guild.id})
 
-# Run the bot with the token
-bot.run(TOKEN)
+    return asyncio.gather(*(edit(message) for message in messages))
+
+@bot.tree.command(name="update_embeds", description="Update many of the bot's embeds in a channel at once (Admin only).")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(
+    channel="The channel where the embed messages are located.",
+    message_ids="Message IDs and ID ranges, e.g. `111 222` or `111-999`.",
+    last="Instead of IDs: every embed the bot posted among the channel's last N messages.",
+    title="The new title for the embeds (optional).",
+    description="The new description for the embeds (optional)."
+)
+async def update_embeds(
+    interaction: discord.Interaction,
+    channel: discord.TextChannel,
+    message_ids: str = None,
+    last: app_commands.Range[int, 1, BULK_EDIT_SCAN_LIMIT] = None,
+    title: str = None,
+    description: str = None
+):
+    if title is None and description is None:
+        await reply(interaction, "Please provide either a `title` or `description` to update the embeds.", ephemeral=True)
+        return
+    if (message_ids is None) == (last is None):
+        await reply(interaction, "Please provide either `message_ids` or `last`.", ephemeral=True)
+        return
+    intervals = None
+    if message_ids is not None:
+        try:
+            intervals = parse_message_id_spec(message_ids)
+        except ValueError:
+            await reply(interaction, "Invalid message IDs. Use numerical IDs separated by spaces, or ranges like `111-999`.", ephemeral=True)
+            return
+
+    await defer(interaction)
+    try:
+        messages, cut_short = await find_bot_embeds(channel, last=last, intervals=intervals)
+    except discord.Forbidden:
+        await interaction.followup.send("I don't have permissions to read message history in that channel.", ephemeral=True)
+        return
+    except discord.HTTPException as e:
+        await interaction.followup.send(f"Could not read the message history of {channel.mention}: {e.text or e.status}.", ephemeral=True)
+        return
+    note = f" Only the first {BULK_EDIT_SCAN_LIMIT} messages were checked." if cut_short else ""
+    if not messages:
+        await interaction.followup.send(f"No embeds from me were found in {channel.mention}.{note}", ephemeral=True)
+        return
+
+    progress = await interaction.followup.send(f"Updating {len(messages)} embeds in {channel.mention}…", ephemeral=True, wait=True)
+    counts = {"edited": 0, "failed": 0}
+    edits = start_embed_edits(messages, title, description, counts)
+    while not edits.done():
+        await asyncio.wait([edits], timeout=BULK_EDIT_PROGRESS_INTERVAL)
+        if not edits.done():
+            await progress.edit(content=f"Updated {counts['edited']} of {len(messages)} embeds in {channel.mention}…")
+
+    failed = f" {counts['failed']} could not be edited." if counts["failed"] else ""
+    await progress.edit(content=f"Updated {counts['edited']} of {len(messages)} embeds in {channel.mention}.{failed}{note}")
+    log.info("Bulk updated %d embeds in channel %s.", counts["edited"], channel.name, extra={"guild_id": channel.guild.id})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dino Discord bot")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "migrate"],
+                        help="'run' starts the bot; 'migrate' copies the JSON files into the SQLite database")
+    parser.add_argument("--force-sync", action="store_true",
+                        help="sync the slash commands with Discord even if they have not changed")
+    parser.add_argument("--shard-count", type=int, default=int(SHARD_COUNT) if SHARD_COUNT else None,
+                        help="total number of shards across all processes (default: Discord's recommendation)")
+    parser.add_argument("--shard-ids", type=parse_shard_ids, default=parse_shard_ids(SHARD_IDS) if SHARD_IDS else None,
+                        help="shards this process runs, e.g. '0-3' or '4,5' (default: all of them)")
+    args = parser.parse_args()
+    force_command_sync = args.force_sync
+
+    if args.shard_ids is not None:
+        if args.shard_count is None:
+            parser.error("--shard-ids needs --shard-count")
+        if args.shard_ids[-1] >= args.shard_count:
+            parser.error(f"shard IDs must be below the shard count ({args.shard_count})")
+        if STORAGE_BACKEND != "sqlite":
+            # The JSON and journal backends rewrite whole files and would overwrite each other
+            parser.error("running a subset of shards needs DINO_STORAGE=sqlite")
+    bot.shard_count = args.shard_count
+    bot.shard_ids = args.shard_ids
+
+    if args.command == "migrate":
+        counts = migrate_json_to_sqlite(database=DATABASE_FILE)
+        print(f"Migrated {counts['roles']} role configs, {counts['user_roles']} role trackers and "
+              f"{counts['birthdays']} birthday lists into {DATABASE_FILE}.")
+        raise SystemExit(0)
+
+    setup_logging()
+    store.load(keep_guild=owns_guild if bot.shard_ids is not None else None)
+    # Treat SIGTERM (e.g. `docker stop`) like Ctrl+C so the bot shuts down cleanly
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        # Run the bot with the token
+        bot.run(TOKEN, log_handler=None)
+    finally:
+        # Write out anything still waiting on the debounce timer
+        store.close()
 